@@ -4,11 +4,18 @@
 # --------------------------
 # App initialization
 
+from time import perf_counter
+
 from flask import Flask
 from flask_wtf.csrf import CSRFProtect
 
-from .extensions import database_ready, init_app, init_db, login_manager
+from .extensions import (addCommands, createColumns, createIndexes,
+                         database_ready, init_app, init_db,
+                         init_episode_summaries, init_result_totals,
+                         login_manager, markDataChanged)
+from .metrics import init_metrics
 from .models import db
+from .profiling import init_profiling
 from .routes import addRoutes
 
 csrf = CSRFProtect()
@@ -34,6 +41,10 @@ def create_app():
 
         # Initialize app with SQLAlchemy
         db.init_app(app)
+        # Optionally record the SQL run by each request
+        init_profiling(app, db)
+        # Optionally record request latencies for /metrics
+        init_metrics(app)
         # Initialize app with CSRF protection from WTForms
         csrf.init_app(app)
 
@@ -41,11 +52,40 @@ def create_app():
         login_manager.init_app(app)
         # Initialize app with defined routes
         addRoutes(app)
+        # Initialize app with maintenance commands for the flask cli
+        addCommands(app)
 
+        start = perf_counter()
         if database_ready(db, app):
+            app.logger.info('Database ready in '
+                            f'{perf_counter() - start:.2f}s')
+
+            start = perf_counter()
             db.create_all()      # Create and populate all tables
             db.session.commit()
+            # columns added since the tables were first created
+            for column in createColumns(db):
+                app.logger.info(f'Created column {column}')
+            # indexes added since the tables were first created
+            for index in createIndexes(db):
+                app.logger.info(f'Created index {index}')
+            # results added before the result_totals rollup existed
+            rows = init_result_totals(db)
+            if rows:
+                app.logger.info(f'Rebuilt result totals ({rows} rows)')
+            # episodes added before their summary columns existed
+            episodes = init_episode_summaries(db)
+            if episodes:
+                app.logger.info(f'Filled in {episodes} episode summaries')
             init_db(db)          # Initialize db with test data
+            # pages browsers cached before a restart may be out of date
+            markDataChanged()
+            app.logger.info('Database initialized in '
+                            f'{perf_counter() - start:.2f}s')
+
+            start = perf_counter()
             init_app(app)        # Initialize app with prepared graphs
+            app.logger.info('App initialized in '
+                            f'{perf_counter() - start:.2f}s')
 
         return app
@@ -0,0 +1,143 @@
+# export.py
+# Created by: Michael Cole
+# Updated by: Michael Cole
+# -----------------------------
+# Streams episodes, results and participant summaries out of the db as CSV
+# or NDJSON for offline analysis. Rows are read a batch at a time, each batch
+# starting after the last row of the one before, and written out as they
+# arrive so exports use the same memory however large the tables grow.
+
+from csv import writer
+from io import StringIO
+from json import dumps
+
+from sqlalchemy import and_, case, func, or_
+
+from .extensions import queryResults
+
+EXPORT_DATASETS = ['episodes', 'results', 'participants']
+EXPORT_FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+# rows fetched from the db and written out at a time
+EXPORT_BATCH_SIZE = 1000
+
+
+def queryExport(dataset, daterange=False, theme=False, participant_id=False):
+    '''
+    Builds the query for one of the export datasets.
+
+    Args:
+        dataset (str): One of EXPORT_DATASETS.
+        daterange (list[date]) - optional: Only export episodes within a date
+            window.
+        theme (str) - optional: Only export episodes with a given theme.
+        participant_id (int) - optional: Only export a single participant's
+            results, or the episodes they took part in.
+    Returns:
+        (tuple): Query selecting labelled columns, one per export column, and
+            the columns it is ordered by, which together are unique to each
+            row.
+    '''
+    from .models import Episodes, Participants, Results, db
+    if dataset == 'episodes':
+        query = db.session.query(Episodes.ep_num, Episodes.date,
+                                 Episodes.num_items, Episodes.theme)
+        if daterange:
+            query = query.filter(Episodes.date.between(daterange[0],
+                                                       daterange[1]))
+        if theme:
+            query = query.filter(Episodes.theme == theme)
+        if participant_id:
+            query = query.filter(queryResults(
+                Results.id, participant_id=participant_id).filter(
+                    Results.episode_id == Episodes.id).exists())
+        return query, [Episodes.ep_num, Episodes.id]
+
+    if dataset == 'results':
+        outcome = case([(Results.is_presenter, 'presenter'),
+                        (Results.is_absent, 'absent'),
+                        (Results.is_correct, 'correct')],
+                       else_='incorrect')
+        query = queryResults(Episodes.ep_num, Episodes.date, Episodes.theme,
+                             Participants.name.label('participant'),
+                             Participants.is_rogue,
+                             outcome.label('outcome'),
+                             participant_id=participant_id,
+                             daterange=daterange, theme=theme)
+        return query, [Episodes.ep_num, Results.id]
+
+    # COUNT ignores the NULLs of absent/presenter results, see
+    # extensions.getResultTotals
+    query = queryResults(
+        Participants.name, Participants.is_rogue,
+        func.sum(Results.is_correct, type_=db.Integer).label('correct'),
+        (func.count(Results.is_correct) -
+         func.sum(Results.is_correct, type_=db.Integer)).label('incorrect'),
+        func.sum(Results.is_absent, type_=db.Integer).label('absent'),
+        func.sum(Results.is_presenter, type_=db.Integer).label('presenter'),
+        (func.sum(Results.is_correct, type_=db.Integer) * 1.0 /
+         func.nullif(func.count(Results.is_correct), 0)).label('accuracy'),
+        participant_id=participant_id, daterange=daterange, theme=theme)
+    query = query.group_by(Participants.id, Participants.name,
+                           Participants.is_rogue)
+    return query, [Participants.name, Participants.id]
+
+
+def streamExport(query, keys, fmt):
+    '''
+    Generates an export a batch of rows at a time. CSV exports start with a
+    header row, NDJSON exports have one JSON object per line.
+
+    Args:
+        query (Query): Query from queryExport.
+        keys (list): Columns the query is ordered by, from queryExport.
+        fmt (str): One of EXPORT_FORMATS.
+    Yields:
+        (str): The next part of the export.
+    '''
+    columns = [column['name'] for column in query.column_descriptions]
+    buffer = StringIO()
+    csv = writer(buffer)
+    if fmt == 'csv':
+        csv.writerow(columns)
+
+    # each batch is its own query starting after the keys of the last row
+    # written, a keyset, as the MySQL driver fetches every row of a query
+    # up front rather than streaming them
+    query = query.add_columns(*keys).order_by(*keys)
+    batch = query.limit(EXPORT_BATCH_SIZE).all()
+    while True:
+        for row in batch:
+            row = row[:len(columns)]
+            if fmt == 'csv':
+                csv.writerow(row)
+            else:
+                buffer.write(dumps(dict(zip(columns, row)), default=str) +
+                             '\n')
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        if len(batch) < EXPORT_BATCH_SIZE:
+            break
+        last = batch[-1][len(columns):]
+        batch = query.filter(getKeysetFilter(keys, last)).limit(
+            EXPORT_BATCH_SIZE).all()
+
+
+def getKeysetFilter(keys, values):
+    '''
+    Builds the filter for rows that come after a row in the order of the
+    given columns, e.g. (a > 1) or (a = 1 and b > 2) for keys [a, b].
+
+    Args:
+        keys (list): Columns rows are ordered by.
+        values (list): Value of each column in the row to start after.
+    Returns:
+        (BooleanClauseList): The filter.
+    '''
+    conditions = []
+    for i, (key, value) in enumerate(zip(keys, values)):
+        conditions.append(and_(*[earlier == earlierValue for earlier,
+                                 earlierValue in zip(keys[:i], values[:i])],
+                               key > value))
+    return or_(*conditions)
@@ -6,17 +6,64 @@
 # by providing ease of use functionality.
 
 from datetime import date, datetime
+from decimal import Decimal
 from hashlib import sha256
-from os import environ, makedirs, path
-from time import sleep
-
+from json import dumps, loads
+from os import environ, makedirs, path, replace, utime
+from pickle import HIGHEST_PROTOCOL, UnpicklingError, dump, load
+from tempfile import mkstemp
+from threading import Lock, Thread
+from time import perf_counter, sleep, time
+
+from click import echo
 from flask_login import LoginManager
+from sqlalchemy import (and_, bindparam, case, extract, false, func, inspect,
+                        or_)
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.sql.util import find_tables
 
 from .testing import testdata
 
 login_manager = LoginManager()
 login_manager.login_view = 'admin_login'
 
+GRAPH_TYPES = ['overallAccuracy', 'accuracyOverTime', 'sweeps']
+
+# tables paged through on the admin page, mapped to the columns they can be
+# sorted by and searched on. Sort columns are never null so, paired with
+# id, they give every row a unique position to page from. Summaries are
+# totalled per participant, so are paged by their totals after grouping
+ADMIN_TABLES = {
+    'participants': {'sort': ['id', 'name', 'date_created', 'is_rogue'],
+                     'search': ['name']},
+    'episodes': {'sort': ['id', 'ep_num', 'date'],
+                 'search': ['ep_num', 'theme']},
+    'results': {'sort': ['id', 'episode_id', 'participant_id'],
+                'search': ['episode_id', 'participant_id']},
+    'rogueSummaries': {'sort': ['id', 'name', 'correct', 'incorrect'],
+                       'search': ['name'], 'grouped': True},
+    'guestSummaries': {'sort': ['id', 'name', 'num_appearances', 'correct',
+                                'incorrect'],
+                       'search': ['name'], 'grouped': True},
+    'episodeSummaries': {'sort': ['id', 'ep_num', 'date'],
+                         'search': ['ep_num', 'theme', 'presenter']},
+}
+
+# (graphType, graphYear) pairs made stale by writes since they were built.
+# Only known to the process that handled the write and lost on restart, so
+# graphs.graphStale also compares graphs with the shared data version
+dirtyGraphs = set()
+
+# progress of the most recent background graph build in this process,
+# shared with every worker by saveGraphBuildStatus
+graphBuildJob = {'running': False}
+graphBuildLock = Lock()
+
+# summary tables shown on /data along with the data version they were
+# computed at, see getDataVersion
+dataSummaries = {'version': None, 'summaries': None}
+dataSummariesLock = Lock()
+
 
 def database_ready(db, app):
     '''
@@ -58,6 +105,57 @@ def database_ready(db, app):
     return success
 
 
+def createColumns(db):
+    '''
+    Adds any columns declared on the models that are missing from the
+    database. db.create_all only creates missing tables, so columns added to
+    existing tables would otherwise never be created. Only the column itself
+    is added, so new columns on existing tables must be nullable and any
+    foreign key is left unenforced.
+
+    Args:
+        db (SQLAlchemy): db object from .models
+    Returns:
+        (list[str]): Names of the columns created, as table.column.
+    '''
+    inspector = inspect(db.engine)
+    created = []
+    for table in db.metadata.sorted_tables:
+        existing = [column['name'] for column in
+                    inspector.get_columns(table.name)]
+        for column in table.columns:
+            if column.name not in existing:
+                columnType = column.type.compile(dialect=db.engine.dialect)
+                db.session.execute(f'ALTER TABLE {table.name} ADD COLUMN '
+                                   f'{column.name} {columnType}')
+                created.append(f'{table.name}.{column.name}')
+    db.session.commit()
+    return created
+
+
+def createIndexes(db):
+    '''
+    Creates any indexes declared on the models that are missing from the
+    database. db.create_all only creates missing tables, so indexes added to
+    existing tables would otherwise never be created.
+
+    Args:
+        db (SQLAlchemy): db object from .models
+    Returns:
+        (list[str]): Names of the indexes created.
+    '''
+    inspector = inspect(db.engine)
+    created = []
+    for table in db.metadata.sorted_tables:
+        existing = [index['name'] for index in
+                    inspector.get_indexes(table.name)]
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(bind=db.engine)
+                created.append(index.name)
+    return created
+
+
 def init_db(db):
     '''
     Initializes database with temporary data if data
@@ -80,34 +178,173 @@ def init_db(db):
         present = getAdmin(admin[0])
         if not present:
             addAdmin(db, admin[0], admin[1])
-    for episode in testdata.getEpisodes(rogues):
-        present = getEpisode(episode['ep_num'])
-        if not present:
-            addEpisode(db, episode['ep_num'], episode['ep_date'],
-                       episode['num_items'], episode['theme'],
-                       episode['guests'], episode['rogues'])
+    # episodes already present are skipped by the bulk loader
+    bulkAddEpisodes(db, testdata.getEpisodes(rogues))
     db.session.commit()
 
 
 def init_app(app):
     '''
-    Initializes the app with custom initializers.
+    Initializes the app with custom initializers. If the
+    GRAPH_BUILD_BACKGROUND env variable is set, graphs are built in a
+    background thread so the app can begin serving requests immediately.
 
     Args:
         app (Flask): app from Flask
     Returns:
         None
     '''
-    init_graphs(app)
+    if int(environ['GRAPH_BUILD_BACKGROUND']):
+        app.logger.info('Building graphs in the background')
+        startGraphBuild(app, force=True)
+    else:
+        init_graphs(app, force=True)
+
+
+def startGraphBuild(app, force=False):
+    '''
+    Starts building graphs in a background thread so that the caller never
+    has to wait on the build. Only one build runs at a time.
 
+    Args:
+        app (Flask): app from Flask
+        force (bool) - optional: Set to True to rebuild every graph rather
+            than only the graphs made stale by new data.
+    Returns:
+        (bool): True if a build was started, False if one was already
+            running.
+    '''
+    with graphBuildLock:
+        if graphBuildJob['running']:
+            return False
+        graphBuildJob.clear()
+        graphBuildJob.update(running=True, force=force,
+                             started=datetime.now().isoformat(),
+                             finished=None, duration=None, error=None,
+                             graphs={})
+    saveGraphBuildStatus(app)
+    thread = Thread(target=runGraphBuild, args=[app, force], daemon=True)
+    thread.start()
+    return True
+
+
+def runGraphBuild(app, force=False):
+    '''
+    Builds graphs from within its own app context while recording progress
+    in graphBuildJob. Designed to be the target of a background thread.
 
-def init_graphs(app):
+    Args:
+        app (Flask): app from Flask
+        force (bool) - optional: Set to True to rebuild every graph.
+    Returns:
+        None
+    '''
+    def progress(graphType, graphYear, status, duration=None):
+        with graphBuildLock:
+            graphBuildJob['graphs'][(graphType, graphYear)] = {
+                'graphType': graphType,
+                'graphYear': graphYear,
+                'status': status,
+                'duration': duration,
+            }
+        saveGraphBuildStatus(app)
+
+    start = perf_counter()
+    error = None
+    try:
+        with app.app_context():
+            init_graphs(app, force=force, progress=progress)
+    except Exception as e:
+        app.logger.exception('Graph build failed')
+        error = str(e)
+    finally:
+        with graphBuildLock:
+            graphBuildJob.update(running=False, error=error,
+                                 finished=datetime.now().isoformat(),
+                                 duration=perf_counter() - start)
+        saveGraphBuildStatus(app)
+
+
+def saveGraphBuildStatus(app):
+    '''
+    Support function used to share the progress of this process's graph
+    build with every worker, so polling any of them reports it. Kept
+    alongside the data version, in a file if the DATA_CACHE_DIR env
+    variable is set, otherwise in the data_version table. Written through
+    its own connection so the build's session is left alone.
+
+    Args:
+        app (Flask): app from Flask
+    Returns:
+        None
+    '''
+    from .models import DataVersion, db
+    with graphBuildLock:
+        status = dict(graphBuildJob)
+        status['graphs'] = list(status.get('graphs', {}).values())
+    status = dumps(status)
+    cacheDir = environ.get('DATA_CACHE_DIR', '')
+    if cacheDir:
+        makedirs(cacheDir, exist_ok=True)
+        fd, tmp_filepath = mkstemp(dir=cacheDir, prefix='.graphBuild',
+                                   suffix='.tmp')
+        with open(fd, 'w') as f:
+            f.write(status)
+        replace(tmp_filepath, path.join(cacheDir, 'graphBuild.json'))
+        return
+    table = DataVersion.__table__
+    with db.get_engine(app).begin() as connection:
+        if not connection.execute(table.update().values(
+                graph_build=status)).rowcount:
+            connection.execute(table.insert().values(
+                id=1, modified=time(), graph_build=status))
+
+
+def getGraphBuildStatus():
+    '''
+    Support function used to report the progress of the most recent
+    background graph build, whichever worker is running it.
+
+    Returns:
+        (dict): Whether a build is running, when it started and finished,
+            its total duration and the status of every graph in it.
+    '''
+    from .models import DataVersion, db
+    cacheDir = environ.get('DATA_CACHE_DIR', '')
+    status = None
+    if cacheDir:
+        try:
+            with open(path.join(cacheDir, 'graphBuild.json')) as f:
+                status = loads(f.read())
+        except (OSError, ValueError):
+            pass
+    else:
+        saved = db.session.query(DataVersion.graph_build).scalar()
+        if saved:
+            status = loads(saved)
+    if status is None:
+        # nothing has been built in the background yet
+        with graphBuildLock:
+            status = dict(graphBuildJob)
+            status['graphs'] = list(status.get('graphs', {}).values())
+    graphs = status['graphs']
+    status['total'] = len(graphs)
+    status['done'] = len([graph for graph in graphs
+                          if graph['status'] == 'built'])
+    return status
+
+
+def init_graphs(app, force=False, progress=None):
     '''
     Initializes the application with the necessary graphs for users.
     (Designed to be used upon app startup).
 
     Args:
         app(Flask): app from Flask
+        force (bool) - optional: Set to True to rebuild every graph rather
+            than only the graphs made stale by new data.
+        progress (function) - optional: Passed on to buildAllGraphs to be
+            told about the progress of every graph.
     Returns:
         None
     '''
@@ -121,62 +358,81 @@ def init_graphs(app):
         app.logger.info('bokeh folder found')
 
     app.logger.info('Building all graphs')
-    graphTypes = ['overallAccuracy', 'accuracyOverTime', 'sweeps']
+    start = perf_counter()
     graphYears = getYears()
     graphYears.append('overall')
-    buildAllGraphs(graphTypes, graphYears)
-    app.logger.info('All graphs built')
+    built = buildAllGraphs(GRAPH_TYPES, graphYears, force=force,
+                           processes=int(environ['GRAPH_BUILD_PROCESSES']),
+                           progress=progress)
+    app.logger.info(f'{len(built)} graphs built in '
+                    f'{perf_counter() - start:.2f}s')
+
+
+def markGraphsDirty(graphYears, graphTypes=GRAPH_TYPES):
+    '''
+    Support function used to flag graphs as stale so that the next
+    buildAllGraphs rebuilds them.
+
+    Args:
+        graphYears (list): Years (or 'overall') whose graphs are stale.
+        graphTypes (list[str]) - optional: Graph types that are stale.
+            Defaults to every graph type.
+    Returns:
+        None
+    '''
+    from .graphs import evictGraphs, renderedGraphsLock
+    graphYears = [str(graphYear) for graphYear in graphYears]
+    for graphType in graphTypes:
+        for graphYear in graphYears:
+            dirtyGraphs.add((graphType, graphYear))
+    # graphs built on demand are not rebuilt, only thrown away
+    with renderedGraphsLock:
+        evictGraphs(graphYears, graphTypes)
 
 
 def getRogues(onlyNames=False, current_date=False, daterange=False):
     '''
     Support function used to retrieve rogues based on certain parameters.
+    Rogues without an end date are treated as active until today. All
+    filtering is done in a single query.
 
     Args:
         onlyNames (bool) - optional: Set to True if only rogue names are
             desired.
-        current_date (bool) - optional: Set to True if only rogues who
-            are currently active are desired.
+        current_date (date) - optional: Pass a date to retrieve only rogues
+            who were active on that date.
         daterange (list or tuple) - optional: Pass a start and stop date
             to retrieve only rogues who were active within a date window.
     Returns:
         (list): List of rogues who meet the specified paramters
     '''
-    from .models import Participants
-    rogues = Participants.query.filter_by(
-        is_rogue=True).order_by(
-            Participants.name).all()
+    from .models import Participants, db
+    if onlyNames:
+        query = db.session.query(Participants.name)
+    else:
+        query = Participants.query
+    query = query.filter_by(is_rogue=True)
+    end_date = func.coalesce(Participants.rogue_end_date, date.today())
 
     if current_date:
-        for rogue in rogues[:]:
-            if not rogue.rogue_end_date:
-                end_date = date.today()
-            else:
-                end_date = rogue.rogue_end_date
-            start_date = rogue.rogue_start_date
-            if not start_date < current_date <= end_date:
-                rogues.remove(rogue)
+        query = query.filter(Participants.rogue_start_date < current_date,
+                             end_date >= current_date)
 
     if daterange:
-        for rogue in rogues[:]:
-            if not rogue.rogue_end_date:
-                end_date = date.today()
-            else:
-                end_date = rogue.rogue_end_date
-            start_date = rogue.rogue_start_date
-            if start_date >= daterange[1] or end_date <= daterange[0]:
-                rogues.remove(rogue)
+        # rogue's time on the show overlaps the window
+        query = query.filter(Participants.rogue_start_date < daterange[1],
+                             end_date > daterange[0])
 
+    rogues = query.order_by(Participants.name).all()
     if onlyNames:
-        for i, rogue in enumerate(rogues):
-            rogues[i] = rogue.name
-
+        rogues = [name for name, in rogues]
     return rogues
 
 
 def getGuests(onlyNames=False, daterange=False):
     '''
     Support function used to retrieve guests based on certain parameters.
+    All filtering is done in a single query.
 
     Args:
         onlyNames (bool) - optional: Set to True if only guest names are
@@ -186,30 +442,22 @@ def getGuests(onlyNames=False, daterange=False):
     Returns:
         (list): List of guests who meet the specified paramters
     '''
-    from .models import Participants
-    guests = Participants.query.filter_by(
-        is_rogue=False).order_by(
-            Participants.name).all()
+    from .models import Participants, Results, db
+    if onlyNames:
+        query = db.session.query(Participants.name)
+    else:
+        query = Participants.query
+    query = query.filter_by(is_rogue=False)
 
     if daterange:
-        for guest in guests[:]:
-            results = getResults(participant_id=guest.id)
-            dates = []
-            for result in results:
-                ep = getEpisode(ep_id=result.episode_id)
-                dates.append(ep.date)
-            present = False
-            for d in dates:
-                if d >= daterange[0] and d <= daterange[1]:
-                    present = True
-                    break
-            if not present:
-                guests.remove(guest)
+        # guest has a result on an episode within the window
+        query = query.filter(queryResults(
+            Results.id, daterange=daterange).filter(
+                Results.participant_id == Participants.id).exists())
 
+    guests = query.order_by(Participants.name).all()
     if onlyNames:
-        for i, guest in enumerate(guests):
-            guests[i] = guest.name
-
+        guests = [name for name, in guests]
     return guests
 
 
@@ -236,9 +484,9 @@ def getYears(desc=False):
     Returns:
         (list): List of all years in db.
     '''
-    from .models import Episodes
-    episodes = Episodes.query.all()
-    dates = sorted(list(set([str(episode.date.year) for episode in episodes])))
+    from .models import Episodes, db
+    years = db.session.query(extract('year', Episodes.date)).distinct()
+    dates = sorted(str(int(year)) for year, in years)
     if desc:
         dates = reversed(dates)
     return dates
@@ -328,7 +576,8 @@ def addParticipant(db, name, is_rogue=False,
         rogue_end_date (date) - optional: Set only if rogue no longer is an
             active rogue.
         commit (bool) - optional: Set to True to have the function commit the
-            changes.
+            changes. Callers committing themselves should call
+            markDataChanged afterwards.
     Returns:
         (Participants): db.Model from the participants table in the db.
     '''
@@ -351,6 +600,18 @@ def addParticipant(db, name, is_rogue=False,
         db.session.add(participant)
         if commit:
             db.session.commit()
+            markDataChanged()
+        if is_rogue:
+            # rogues show up in the accuracy graphs for every year they
+            # are active, guests only once they have results
+            startYear = (rogue_start_date or date.today()).year
+            endYear = (rogue_end_date or date.today()).year
+            graphYears = list(range(startYear, endYear + 1))
+            graphYears.append('overall')
+            # marked after the commit, see addEpisode
+            markGraphsDirty(graphYears,
+                            graphTypes=['overallAccuracy',
+                                        'accuracyOverTime'])
 
         return participant
 
@@ -384,7 +645,8 @@ def getAllParticipants():
     return participants
 
 
-def addResult(db, episode_id, rogue_id, is_correct, commit=False):
+def addResult(db, episode_id, rogue_id, is_correct, commit=False,
+              totals=True):
     '''
     Support function used to add a new result to the db.
 
@@ -394,23 +656,365 @@ def addResult(db, episode_id, rogue_id, is_correct, commit=False):
         rogue_id (int): Unique Rogue ID
         is_correct (bool): True/False indicating rogue result.
         commit (bool) - optional: Set to True to have the function commit the
-            changes.
+            changes. Callers committing themselves should call
+            markDataChanged afterwards.
+        totals (bool) - optional: Set to False to leave adding the result to
+            the result_totals rollup and the episode's summary columns to the
+            caller, e.g. addEpisode adds every result of an episode at once.
     Returns:
         (Results): db.Model from the results table in the db.
     '''
-    from .models import Results
+    from .models import Episodes, Results
     result = Results(episode_id, rogue_id, is_correct)
     db.session.add(result)
+    if not totals:
+        return result
+
+    # totalled in the same transaction as the result itself. The date is a
+    # 'YYYY-MM-DD' string for episodes just added from the admin form
+    episode = Episodes.query.get(episode_id)
+    year = int(str(episode.date)[:4])
+    addResultTotals(db, {(rogue_id, year, episode.theme or ''):
+                         getOutcomeTotals(Results.getOutcome(is_correct))})
+    updateEpisodeSummaries(db, episode_id=episode_id, commit=False)
+    # updated in the db, so the episode has to be loaded again
+    db.session.expire(episode)
     if commit:
         db.session.commit()
+        markDataChanged()
+    # marked after the commit, see addEpisode
+    markGraphsDirty([str(year), 'overall'])
     return result
 
 
+def getOutcomeTotals(outcome):
+    '''
+    Support function used to convert a single result into totals that can be
+    added to the result_totals rollup.
+
+    Args:
+        outcome (dict): Column values of the result, see Results.getOutcome.
+    Returns:
+        (tuple): (correct, incorrect, absent, presenter) totals.
+    '''
+    return (int(outcome['is_correct'] == 1), int(outcome['is_correct'] == 0),
+            int(bool(outcome['is_absent'])),
+            int(bool(outcome['is_presenter'])))
+
+
+def addResultTotals(db, totals, attempts=3):
+    '''
+    Support function used to add the totals of newly added results to the
+    result_totals rollup. Doesn't commit so the rollup is updated in the
+    same transaction as the results. On MySQL every row is upserted with
+    INSERT ... ON DUPLICATE KEY UPDATE, so concurrent writers adding to the
+    same new row can't collide. Elsewhere existing rows are read with a
+    locking read and updated, and the rest inserted.
+
+    Args:
+        db (SQLAlchemy db): db object.
+        totals (dict): (participant_id, year, theme) mapped to (correct,
+            incorrect, absent, presenter) totals of the new results. theme
+            is '' for episodes without one.
+        attempts (int) - optional: Number of times to try again if another
+            writer inserts some of the same rows first.
+    Returns:
+        None
+    '''
+    from .models import ResultTotals
+    table = ResultTotals.__table__
+    rows = [{'participant_id': participant_id, 'year': year, 'theme': theme,
+             'correct': correct, 'incorrect': incorrect, 'absent': absent,
+             'presenter': presenter}
+            for (participant_id, year, theme), (correct, incorrect, absent,
+                                                presenter) in totals.items()]
+    if not rows:
+        return
+    if db.engine.dialect.name == 'mysql':
+        from sqlalchemy.dialects.mysql import insert
+        upsert = insert(table)
+        db.session.execute(upsert.on_duplicate_key_update(
+            correct=table.c.correct + upsert.inserted.correct,
+            incorrect=table.c.incorrect + upsert.inserted.incorrect,
+            absent=table.c.absent + upsert.inserted.absent,
+            presenter=table.c.presenter + upsert.inserted.presenter), rows)
+        return
+
+    participantIds = set(participant_id for participant_id, year, theme
+                         in totals)
+    years = set(year for participant_id, year, theme in totals)
+    # a locking read sees rows committed since the transaction began
+    existing = {(participant_id, year, theme): id
+                for id, participant_id, year, theme in db.session.query(
+                    ResultTotals.id, ResultTotals.participant_id,
+                    ResultTotals.year, ResultTotals.theme).filter(
+                        ResultTotals.participant_id.in_(participantIds),
+                        ResultTotals.year.in_(years)).with_for_update()}
+
+    updates = []
+    inserts = []
+    for row in rows:
+        key = (row['participant_id'], row['year'], row['theme'])
+        if key in existing:
+            updates.append({'row_id': existing[key],
+                            'add_correct': row['correct'],
+                            'add_incorrect': row['incorrect'],
+                            'add_absent': row['absent'],
+                            'add_presenter': row['presenter']})
+        else:
+            inserts.append(row)
+    if updates:
+        # incremented by the db so concurrent updates aren't lost
+        db.session.execute(
+            table.update().where(table.c.id == bindparam('row_id')).values(
+                correct=table.c.correct + bindparam('add_correct'),
+                incorrect=table.c.incorrect + bindparam('add_incorrect'),
+                absent=table.c.absent + bindparam('add_absent'),
+                presenter=table.c.presenter + bindparam('add_presenter')),
+            updates)
+    if inserts:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(table.insert(), inserts)
+        except IntegrityError:
+            # another writer inserted some of the same rows first, add to
+            # theirs instead
+            if attempts <= 1:
+                raise
+            addResultTotals(db, {
+                (row['participant_id'], row['year'], row['theme']):
+                totals[(row['participant_id'], row['year'], row['theme'])]
+                for row in inserts}, attempts=attempts - 1)
+
+
+def rebuildResultTotals(db):
+    '''
+    Support function used to rebuild the result_totals rollup from scratch
+    by totalling every result, then commits.
+
+    Args:
+        db (SQLAlchemy db): db object.
+    Returns:
+        (int): Number of rows in the rebuilt rollup.
+    '''
+    from .models import Episodes, Results, ResultTotals
+    year = extract('year', Episodes.date)
+    theme = func.coalesce(Episodes.theme, '')
+    # COUNT ignores the NULLs of absent/presenter results
+    correct = func.coalesce(func.sum(Results.is_correct, type_=db.Integer), 0)
+    query = queryResults(Results.participant_id, year, theme, correct,
+                         func.count(Results.is_correct) - correct,
+                         func.sum(Results.is_absent, type_=db.Integer),
+                         func.sum(Results.is_presenter, type_=db.Integer))
+    query = query.group_by(Results.participant_id, year, theme)
+
+    table = ResultTotals.__table__
+    db.session.execute(table.delete())
+    db.session.execute(table.insert().from_select(
+        ['participant_id', 'year', 'theme', 'correct', 'incorrect', 'absent',
+         'presenter'], query.statement))
+    db.session.commit()
+    return ResultTotals.query.count()
+
+
+def init_result_totals(db):
+    '''
+    Fills the result_totals rollup if it is empty but there are results,
+    e.g. results added before the rollup existed.
+
+    Args:
+        db (SQLAlchemy): db object from .models
+    Returns:
+        (int): Number of rows in the rebuilt rollup, 0 if it wasn't rebuilt.
+    '''
+    from .models import Results, ResultTotals
+    if ResultTotals.query.first() or not Results.query.first():
+        return 0
+    return rebuildResultTotals(db)
+
+
+def getEpisodeSummary(correct, incorrect, absent, presenter_id):
+    '''
+    Support function used to get the summary columns of an episode from the
+    totals of its results. An episode is a presenter sweep if nobody got it
+    right and a participant sweep if nobody got it wrong.
+
+    Args:
+        correct (int): Number of correct results.
+        incorrect (int): Number of incorrect results.
+        absent (int): Number of absent participants.
+        presenter_id (int): Unique Participant ID of the presenter, None if
+            there wasn't one.
+    Returns:
+        (dict): Values for the episode's summary columns.
+    '''
+    return {'num_correct': correct, 'num_incorrect': incorrect,
+            'num_absent': absent, 'presenter_id': presenter_id,
+            'presenter_sweep': correct == 0,
+            'participant_sweep': incorrect == 0}
+
+
+def tallyEpisodeResults(outcomes):
+    '''
+    Support function used to total an episode's results as they are added
+    to get its summary columns.
+
+    Args:
+        outcomes (list[dict]): Column values of the episode's results, see
+            Results.getOutcome, with their participant_id.
+    Returns:
+        (dict): Values for the episode's summary columns.
+    '''
+    correct, incorrect, absent, presenter_id = 0, 0, 0, None
+    for outcome in outcomes:
+        isCorrect, isIncorrect, isAbsent, isPresenter = getOutcomeTotals(
+            outcome)
+        correct += isCorrect
+        incorrect += isIncorrect
+        absent += isAbsent
+        if isPresenter:
+            presenter_id = outcome['participant_id']
+    return getEpisodeSummary(correct, incorrect, absent, presenter_id)
+
+
+def updateEpisodeSummaries(db, missing=False, episode_id=False,
+                           commit=True):
+    '''
+    Support function used to fill in the summary columns of episodes from
+    their results with a single aggregate query. Used to backfill episodes
+    added before the columns existed, and to bring an episode up to date
+    after a result is added to it on its own.
+
+    Args:
+        db (SQLAlchemy db): db object.
+        missing (bool) - optional: Set to True to only fill in episodes whose
+            summary columns haven't been filled in yet.
+        episode_id (int) - optional: Only fill in a single episode.
+        commit (bool) - optional: Set to False to leave committing the
+            changes to the caller.
+    Returns:
+        (int): Number of episodes updated.
+    '''
+    from .models import Episodes, Results
+    # COUNT ignores the NULLs of absent/presenter results
+    correct = func.coalesce(func.sum(Results.is_correct, type_=db.Integer), 0)
+    query = db.session.query(
+        Episodes.id, correct, func.count(Results.is_correct) - correct,
+        func.coalesce(func.sum(Results.is_absent, type_=db.Integer), 0),
+        func.max(case([(Results.is_presenter, Results.participant_id)])))
+    query = query.outerjoin(Results, Results.episode_id == Episodes.id)
+    if missing:
+        query = query.filter(Episodes.num_correct.is_(None))
+    if episode_id:
+        query = query.filter(Episodes.id == episode_id)
+    query = query.group_by(Episodes.id)
+
+    updates = []
+    for id, correct, incorrect, absent, presenter_id in query:
+        summary = getEpisodeSummary(correct, incorrect, absent, presenter_id)
+        summary['row_id'] = id
+        updates.append(summary)
+    if updates:
+        # the columns set are taken from the keys of the summaries
+        table = Episodes.__table__
+        db.session.execute(
+            table.update().where(table.c.id == bindparam('row_id')), updates)
+    if commit:
+        db.session.commit()
+    return len(updates)
+
+
+def init_episode_summaries(db):
+    '''
+    Fills in the summary columns of any episodes added before the columns
+    existed.
+
+    Args:
+        db (SQLAlchemy): db object from .models
+    Returns:
+        (int): Number of episodes filled in.
+    '''
+    return updateEpisodeSummaries(db, missing=True)
+
+
+def addCommands(app):
+    '''
+    Adds the app's maintenance commands to the flask command line.
+
+    Args:
+        app (Flask App): App to add the commands to.
+    Returns:
+        None
+    '''
+
+    @app.cli.command('backfill-episode-summaries')
+    def backfillEpisodeSummaries():
+        '''
+        Adds any missing columns and recomputes the summary columns of every
+        episode from its results.
+        '''
+        from .models import db
+        for column in createColumns(db):
+            echo(f'Created column {column}')
+        echo(f'Updated {updateEpisodeSummaries(db)} episode summaries')
+
+
+def queryResults(*columns, episode_id=False, participant_id=False,
+                 daterange=False, theme=False):
+    '''
+    Support function to build a query over the results table from any
+    combination of filters. Episodes and participants are only joined in
+    when a filter or one of the selected columns needs them.
+
+    Args:
+        *columns - optional: Columns or aggregates to select instead of
+            Results objects, e.g. Results.participant_id or
+            func.count(Results.id). Rows are then returned as tuples.
+        episode_id (int) - optional: Only include results for a single
+            episode.
+        participant_id (int) - optional: Only include results for a single
+            participant.
+        daterange (list[date]) - optional: Only include results within a
+            date window.
+        theme (str) - optional: Only include results for a given theme.
+    Returns:
+        (Query): The filtered query, which can be filtered, grouped or
+            ordered further.
+    '''
+    from .models import Episodes, Participants, Results, db
+    if columns:
+        query = db.session.query(*columns).select_from(Results)
+    else:
+        query = Results.query
+
+    tables = set()
+    for column in columns:
+        if hasattr(column, '__clause_element__'):
+            column = column.__clause_element__()
+        tables.update(find_tables(column, check_columns=True))
+    if daterange or theme or Episodes.__table__ in tables:
+        query = query.join(Episodes, Results.episode_id == Episodes.id)
+    if Participants.__table__ in tables:
+        query = query.join(Participants,
+                           Results.participant_id == Participants.id)
+
+    if episode_id:
+        query = query.filter(Results.episode_id == episode_id)
+    if participant_id:
+        query = query.filter(Results.participant_id == participant_id)
+    if daterange:
+        query = query.filter(Episodes.date.between(daterange[0],
+                                                   daterange[1]))
+    if theme:
+        query = query.filter(Episodes.theme == theme)
+    return query
+
+
 def getResults(episode_id=False, participant_id=False,
-               daterange=False, theme=False):
+               daterange=False, theme=False, columns=False):
     '''
     Support function to retrieve data from the results table based on given
-    parameters.
+    parameters. Any combination of parameters can be given.
 
     Args:
         episode_id (int) - optional: Set to retrieve all results for a single
@@ -420,48 +1024,126 @@ def getResults(episode_id=False, participant_id=False,
         daterange (list[date]) - optional: Set to retrieve all results within
             a date window.
         theme (str) - optional: Set to retrieve all results for a given theme.
+        columns (list) - optional: Set to retrieve only these columns as
+            lightweight tuples rather than Results objects.
     Returns:
         (list): List of all results in the table that match the given
-            parameters.
+            parameters. If both episode_id and participant_id are given,
+            only the single matching result is returned.
     '''
-    from .models import Results, Episodes
+    query = queryResults(*(columns or []), episode_id=episode_id,
+                         participant_id=participant_id,
+                         daterange=daterange, theme=theme)
     if episode_id and participant_id:
         # get specific result for this participant on this episode
-        return Results.query.filter_by(episode_id=episode_id,
-                                       participant_id=participant_id).first()
-    elif episode_id and not (participant_id or daterange or theme):
-        # get all results for this specific episode
-        return Results.query.filter_by(episode_id=episode_id).all()
-    elif participant_id and not (episode_id or daterange or theme):
-        # get all results for this specific participant
-        return Results.query.filter_by(participant_id=participant_id).all()
-    elif theme and not (episode_id or participant_id or daterange):
-        # get all results for this specific theme
-        return Results.query.join(Episodes).filter(
-            Episodes.theme == theme).all()
-    elif daterange and not (episode_id or participant_id or theme):
-        # get all results within a date range
-        return Results.query.join(Episodes).filter(
-            Episodes.date.between(daterange[0], daterange[1])).all()
-    elif participant_id and daterange and not theme:
-        # get all results for this specific participant
-        # over this period of time
-        return Results.query.join(Episodes).filter(
-            Episodes.date.between(daterange[0], daterange[1]),
-            Results.participant_id == participant_id).all()
-    elif participant_id and theme and not daterange:
-        # get all results for this specific participant
-        # for this theme
-        return Results.query.join(Episodes).filter(
-            Episodes.theme == theme,
-            Results.participant_id == participant_id).all()
-    elif participant_id and daterange and theme:
-        # get all results for this specific participant
-        # within this daterange and this theme
-        return Results.query.join(Episodes).filter(
-            Episodes.date.between(daterange[0], daterange[1]),
-            Episodes.theme == theme,
-            Results.participant_id == participant_id).all()
+        return query.first()
+    return query.all()
+
+
+def getResultTotals(groupBy=False, episode_id=False, participant_id=False,
+                    daterange=False, theme=False):
+    '''
+    Support function to total up results, with the totalling done by the
+    database rather than by loading every result.
+
+    Args:
+        groupBy (Column) - optional: Column to total results by, e.g.
+            Results.participant_id. Set to get totals for each value.
+        episode_id (int) - optional: Only total results for a single
+            episode.
+        participant_id (int) - optional: Only total results for a single
+            participant.
+        daterange (list[date]) - optional: Only total results within a date
+            window.
+        theme (str) - optional: Only total results for a given theme.
+    Returns:
+        (tuple or dict): (correct, incorrect, absent, presenter) totals. If
+            groupBy is set, a dict mapping each value to its totals.
+    '''
+    from .models import Results, db
+    # whole years can be totalled from the rollup rather than every result
+    wholeYears = not daterange or (
+        (daterange[0].month, daterange[0].day) == (1, 1) and
+        (daterange[1].month, daterange[1].day) == (12, 31))
+    if (wholeYears and not episode_id and
+            (groupBy is False or groupBy is Results.participant_id)):
+        return getRollupTotals(groupBy=bool(groupBy),
+                               participant_id=participant_id,
+                               daterange=daterange, theme=theme)
+
+    # COUNT ignores the NULLs of absent/presenter results, SUMs are typed as
+    # integers so they aren't coerced back into booleans
+    totals = [func.sum(Results.is_correct, type_=db.Integer),
+              func.count(Results.is_correct),
+              func.sum(Results.is_absent, type_=db.Integer),
+              func.sum(Results.is_presenter, type_=db.Integer)]
+    if groupBy:
+        totals.insert(0, groupBy)
+    query = queryResults(*totals, episode_id=episode_id,
+                         participant_id=participant_id,
+                         daterange=daterange, theme=theme)
+    if not groupBy:
+        return getTotals(*query.one())
+    return {row[0]: getTotals(*row[1:])
+            for row in query.group_by(groupBy).all()}
+
+
+def getRollupTotals(groupBy=False, participant_id=False, daterange=False,
+                    theme=False):
+    '''
+    Support function for getResultTotals that totals results from the
+    result_totals rollup.
+
+    Args:
+        groupBy (bool) - optional: Set to True to get totals for each
+            participant.
+        participant_id (int) - optional: Only total results for a single
+            participant.
+        daterange (list[date]) - optional: Only total results within a window
+            of whole years.
+        theme (str) - optional: Only total results for a given theme.
+    Returns:
+        (tuple or dict): (correct, incorrect, absent, presenter) totals. If
+            groupBy is set, a dict mapping each participant_id to its
+            totals.
+    '''
+    from .models import ResultTotals, db
+    totals = [func.sum(ResultTotals.correct, type_=db.Integer),
+              func.sum(ResultTotals.incorrect, type_=db.Integer),
+              func.sum(ResultTotals.absent, type_=db.Integer),
+              func.sum(ResultTotals.presenter, type_=db.Integer)]
+    if groupBy:
+        totals.insert(0, ResultTotals.participant_id)
+    query = db.session.query(*totals)
+    if participant_id:
+        query = query.filter(ResultTotals.participant_id == participant_id)
+    if daterange:
+        query = query.filter(ResultTotals.year.between(daterange[0].year,
+                                                       daterange[1].year))
+    if theme:
+        query = query.filter(ResultTotals.theme == theme)
+    # SUMs of no rows are NULL
+    if not groupBy:
+        return tuple(int(total or 0) for total in query.one())
+    return {row[0]: tuple(int(total) for total in row[1:])
+            for row in query.group_by(ResultTotals.participant_id)}
+
+
+def getTotals(correct, scored, absent, presenter):
+    '''
+    Converts the aggregates selected by getResultTotals into totals, SUMs of
+    no rows are NULL.
+
+    Args:
+        correct (int): Number of correct results.
+        scored (int): Number of correct or incorrect results.
+        absent (int): Number of absent results.
+        presenter (int): Number of presenter results.
+    Returns:
+        (tuple): (correct, incorrect, absent, presenter) totals.
+    '''
+    correct = correct or 0
+    return correct, scored - correct, absent or 0, presenter or 0
 
 
 def getAllResults():
@@ -492,12 +1174,14 @@ def addEpisode(db, ep_num, date, num_items, theme, guests, participant_results,
         participant_results (list[tuple(Participants,str)]): A list of tuples
             that give a participant as well as the result.
         commit (bool) - optional: Set to True to have the function commit the
-            changes.
+            changes. Callers committing themselves should call
+            markDataChanged afterwards.
     Returns:
         (Results): db.Model from the episodes table in the db.
     '''
-    from .models import Episodes
+    from .models import Episodes, Results
     results = []
+    outcomes = []
     episode = Episodes(ep_num, date, num_items, theme)
     db.session.add(episode)
     episode = getEpisode(ep_num=ep_num)
@@ -505,14 +1189,144 @@ def addEpisode(db, ep_num, date, num_items, theme, guests, participant_results,
         present = getParticipant(name)
         if not present:
             addParticipant(db, name)
+    totals = {}
+    # date is either a date or a 'YYYY-MM-DD' string from the admin form
+    year = int(str(date)[:4])
     for (participant, correct) in participant_results:
         rogue = getParticipant(participant)
-        results.append(addResult(db, episode.id, rogue.id, correct))
+        results.append(addResult(db, episode.id, rogue.id, correct,
+                                 totals=False))
+        outcome = Results.getOutcome(correct)
+        outcome['participant_id'] = rogue.id
+        outcomes.append(outcome)
+        key = (rogue.id, year, theme or '')
+        totals[key] = tuple(a + b for a, b in zip(
+            totals.get(key, (0, 0, 0, 0)), getOutcomeTotals(outcome)))
+    if totals:
+        # the whole episode is added to the rollup at once, in the same
+        # transaction as its results
+        addResultTotals(db, totals)
+    for column, value in tallyEpisodeResults(outcomes).items():
+        setattr(episode, column, value)
     if commit:
         db.session.commit()
+        markDataChanged()
+    # marked after the commit, otherwise a graph build running alongside
+    # could clear the flag and build from the data from before it
+    markGraphsDirty([str(year), 'overall'])
     return episode, results
 
 
+def bulkAddEpisodes(db, episodes, chunksize=1000):
+    '''
+    Support function used to add many episodes to the db at once, e.g. test
+    data. Participant names are resolved once up front and episodes and
+    results are inserted with executemany, committing every chunksize
+    episodes. Episodes whose ep_num is already in the db are skipped.
+
+    Args:
+        db (SQLAlchemy db): db object.
+        episodes (iterable[dict]): Episodes in the testdata.getEpisodes
+            format, with ep_num, ep_date, num_items, theme, guests and
+            rogues keys. Can be a generator.
+        chunksize (int) - optional: Number of episodes inserted per
+            transaction.
+    Returns:
+        (int): Number of episodes added.
+    '''
+    from .models import Episodes, Participants
+    db.session.commit()
+    # names are stored title-cased, see Participants
+    participants = dict(db.session.query(Participants.name,
+                                         Participants.id))
+    existing = set(ep_num for ep_num, in db.session.query(Episodes.ep_num))
+    graphYears = set()
+    added = 0
+    chunk = []
+    for episode in episodes:
+        if episode['ep_num'] in existing:
+            continue
+        existing.add(episode['ep_num'])
+        chunk.append(episode)
+        if len(chunk) == chunksize:
+            insertEpisodes(db, chunk, participants)
+            added += len(chunk)
+            graphYears.update(str(ep['ep_date'])[:4] for ep in chunk)
+            chunk = []
+    if chunk:
+        insertEpisodes(db, chunk, participants)
+        added += len(chunk)
+        graphYears.update(str(ep['ep_date'])[:4] for ep in chunk)
+
+    if added:
+        graphYears.add('overall')
+        markGraphsDirty(graphYears)
+    return added
+
+
+def insertEpisodes(db, episodes, participants):
+    '''
+    Support function for bulkAddEpisodes that inserts a chunk of episodes,
+    any new guests and all of their results, adds the results to the
+    result_totals rollup, then commits. Episodes are inserted with their
+    summary columns already totalled.
+
+    Args:
+        db (SQLAlchemy db): db object.
+        episodes (list[dict]): Episodes in the testdata.getEpisodes format.
+        participants (dict): Participant names mapped to ids. New guests
+            are added to it.
+    Returns:
+        None
+    '''
+    from .models import Episodes, Participants, Results
+    newGuests = set(name.title() for episode in episodes
+                    for name in episode['guests'])
+    newGuests = newGuests.difference(participants)
+    if newGuests:
+        db.session.execute(
+            Participants.__table__.insert(),
+            [dict(name=name, date_created=date.today(), is_rogue=False)
+             for name in sorted(newGuests)])
+        participants.update(db.session.query(
+            Participants.name, Participants.id).filter(
+                Participants.name.in_(sorted(newGuests))))
+
+    outcomes = {}
+    totals = {}
+    for episode in episodes:
+        year = int(str(episode['ep_date'])[:4])
+        outcomes[episode['ep_num']] = []
+        for name, correct in episode['rogues']:
+            result = Results.getOutcome(correct)
+            result['participant_id'] = participants[name.title()]
+            outcomes[episode['ep_num']].append(result)
+            key = (result['participant_id'], year, episode['theme'] or '')
+            totals[key] = tuple(a + b for a, b in zip(
+                totals.get(key, (0, 0, 0, 0)), getOutcomeTotals(result)))
+
+    db.session.execute(
+        Episodes.__table__.insert(),
+        [dict(ep_num=episode['ep_num'], date=episode['ep_date'],
+              num_items=episode['num_items'],
+              theme=episode['theme'] or None,
+              **tallyEpisodeResults(outcomes[episode['ep_num']]))
+         for episode in episodes])
+    episodeIds = dict(db.session.query(Episodes.ep_num, Episodes.id).filter(
+        Episodes.ep_num.in_([episode['ep_num'] for episode in episodes])))
+
+    results = []
+    for ep_num, episodeResults in outcomes.items():
+        for result in episodeResults:
+            result['episode_id'] = episodeIds[ep_num]
+            results.append(result)
+    if results:
+        db.session.execute(Results.__table__.insert(), results)
+        addResultTotals(db, totals)
+    db.session.commit()
+    markDataChanged()
+
+
 def getEpisode(ep_num=False, ep_id=False):
     '''
     Support function to retrieve an episode from the db.
@@ -566,6 +1380,177 @@ def getAllEpisodes(daterange=False, desc=False):
     return episodes
 
 
+def getNextEpNum():
+    '''
+    Support function used to suggest the episode number of the next entry.
+
+    Returns:
+        (int): One more than the highest episode number in the db.
+    '''
+    from .models import Episodes
+    return (Episodes.query.with_entities(
+        func.max(Episodes.ep_num)).scalar() or 0) + 1
+
+
+def getTablePage(table, sort='id', desc=False, search='', after=None,
+                 before=None, limit=50):
+    '''
+    Support function used to page through a table in the db for the admin
+    page. Pages start from the (sort, id) of the last row seen, a keyset,
+    rather than an offset so every page costs the same however far into
+    the table it is.
+
+    Args:
+        table (str): Name of the table, one of ADMIN_TABLES.
+        sort (str) - optional: Column to sort by, from ADMIN_TABLES.
+        desc (bool) - optional: Set to True to sort in descending order.
+        search (str) - optional: Only include rows where a search column
+            contains the text, or equals it for number columns.
+        after (list) - optional: [sort value, id] of the row the page starts
+            after.
+        before (list) - optional: [sort value, id] of the row the page ends
+            before.
+        limit (int) - optional: Number of rows in the page.
+    Returns:
+        (dict): rows in the page as dicts, and the next and prev [sort value,
+            id] cursors to page from, None at either end of the table.
+    '''
+    query, columns = getTableQuery(table)
+    sortColumn = columns[sort]
+    idColumn = columns['id']
+
+    if search:
+        matches = []
+        for name in ADMIN_TABLES[table]['search']:
+            column = columns[name]
+            if column.type.python_type is int:
+                if search.isdigit():
+                    matches.append(column == int(search))
+            else:
+                matches.append(column.contains(search, autoescape=True))
+        query = query.filter(or_(*matches) if matches else false())
+
+    # paging backwards walks the table in reverse then flips the page
+    cursor = before if before is not None else after
+    reverse = desc != (before is not None)
+    if cursor is not None:
+        value, id = cursor
+        if sortColumn.type.python_type is date:
+            value = date.fromisoformat(value)
+        # the first condition is redundant but lets the db seek straight
+        # to the cursor in the sort column's index
+        if reverse:
+            conditions = [sortColumn <= value,
+                          or_(sortColumn < value,
+                              and_(sortColumn == value, idColumn < id))]
+        else:
+            conditions = [sortColumn >= value,
+                          or_(sortColumn > value,
+                              and_(sortColumn == value, idColumn > id))]
+        # totals only exist once rows are grouped
+        if ADMIN_TABLES[table].get('grouped'):
+            query = query.having(and_(*conditions))
+        else:
+            query = query.filter(*conditions)
+    if reverse:
+        query = query.order_by(sortColumn.desc(), idColumn.desc())
+    else:
+        query = query.order_by(sortColumn, idColumn)
+
+    # one extra row tells whether there is another page
+    rows = [getRowDict(row) for row in query.limit(limit + 1)]
+    more = len(rows) > limit
+    rows = rows[:limit]
+    if before is not None:
+        rows.reverse()
+    if not rows:
+        return {'rows': [], 'next': None, 'prev': None}
+    first = [rows[0][sort], rows[0]['id']]
+    last = [rows[-1][sort], rows[-1]['id']]
+    if before is not None:
+        return {'rows': rows, 'next': last, 'prev': first if more else None}
+    return {'rows': rows, 'next': last if more else None,
+            'prev': first if after is not None else None}
+
+
+def getTableQuery(table):
+    '''
+    Support function for getTablePage that gets the query a table is paged
+    through. The db tables are paged as they are, the summaries are the
+    same totals as the user friendly tables on /data.
+
+    Args:
+        table (str): Name of the table, one of ADMIN_TABLES.
+    Returns:
+        (tuple): The query, and the name of each column in it mapped to the
+            column, including an id column unique to each row.
+    '''
+    from .models import Episodes, Participants, Results, ResultTotals, db
+    if table in ['participants', 'episodes', 'results']:
+        model = {'participants': Participants, 'episodes': Episodes,
+                 'results': Results}[table]
+        columns = {column.name: getattr(model, column.name)
+                   for column in model.__table__.columns}
+        query = db.session.query(*[column.label(name)
+                                   for name, column in columns.items()])
+        return query, columns
+
+    if table == 'episodeSummaries':
+        correct, incorrect = Episodes.num_correct, Episodes.num_incorrect
+        columns = {'id': Episodes.id, 'ep_num': Episodes.ep_num,
+                   'date': Episodes.date, 'num_items': Episodes.num_items,
+                   'theme': Episodes.theme, 'presenter': Participants.name,
+                   'correct': correct, 'incorrect': incorrect}
+    else:
+        correct = func.sum(ResultTotals.correct, type_=db.Integer)
+        incorrect = func.sum(ResultTotals.incorrect, type_=db.Integer)
+        columns = {'id': Participants.id, 'name': Participants.name}
+        if table == 'rogueSummaries':
+            columns.update(rogue_start_date=Participants.rogue_start_date,
+                           rogue_end_date=Participants.rogue_end_date)
+        else:
+            columns['num_appearances'] = func.sum(
+                ResultTotals.correct + ResultTotals.incorrect,
+                type_=db.Integer)
+        columns.update(correct=correct, incorrect=incorrect)
+    # null rather than dividing by zero when nothing was scored
+    columns['accuracy'] = func.round(
+        100.0 * correct / func.nullif(correct + incorrect, 0), 2,
+        type_=db.Float)
+    query = db.session.query(*[column.label(name)
+                               for name, column in columns.items()])
+    if table == 'episodeSummaries':
+        # only episodes with a presenter, as on /data
+        return query.select_from(Episodes).join(
+            Participants, Episodes.presenter_id == Participants.id), columns
+    query = query.select_from(Participants).join(
+        ResultTotals, ResultTotals.participant_id == Participants.id).filter(
+            Participants.is_rogue == (table == 'rogueSummaries')).group_by(
+                Participants.id)
+    return query, columns
+
+
+def getRowDict(row):
+    '''
+    Support function used to convert a row from the db into a dict that can
+    be served as JSON, with dates as 'YYYY-MM-DD' strings and MySQL's
+    decimal totals as numbers.
+
+    Args:
+        row (tuple): Row of labelled columns from getTableQuery.
+    Returns:
+        (dict): Name of each column mapped to its value.
+    '''
+    values = {}
+    for name, value in row._asdict().items():
+        if isinstance(value, date):
+            value = value.isoformat()
+        elif isinstance(value, Decimal):
+            value = int(value) if value == int(value) else float(value)
+        values[name] = value
+    return values
+
+
 def addAdmin(db, username, password,
              firstname=False, lastname=False,
              encrypted=False, commit=False):
@@ -614,6 +1599,154 @@ def getAdmin(username=False, all=False):
         return admins
 
 
+def getDataSummaries(db):
+    '''
+    Support function used to get the summary tables shown on /data without
+    running their aggregate queries on every page view. /admin pages
+    through them instead, see getTablePage.
+    Summaries are cached until the data version changes, in this process
+    or, if the DATA_CACHE_DIR env variable is set, in a file shared by every
+    worker.
+
+    Args:
+        db (SQLAlchemy db): db object.
+    Returns:
+        (dict): userFriendlyRogues, userFriendlyGuests, ep_data and sum_data
+            template arguments, each a list of rows as dicts.
+    '''
+    cacheDir = environ.get('DATA_CACHE_DIR', '')
+    if cacheDir:
+        summaries = readSharedDataSummaries(cacheDir)
+    else:
+        # read before computing so summaries racing with a write are
+        # cached against the version from before it
+        version = getDataVersion()
+        with dataSummariesLock:
+            summaries = None
+            if dataSummaries['version'] == version:
+                summaries = dataSummaries['summaries']
+    if summaries is not None:
+        return summaries
+
+    start = time()
+    summaries = {
+        'userFriendlyRogues': [dict(row)
+                               for row in getUserFriendlyRogues(db)],
+        'userFriendlyGuests': [dict(row)
+                               for row in getUserFriendlyGuests(db)],
+        'ep_data': [dict(row) for row in getUserFriendlyEpisodeData(db)],
+        'sum_data': [dict(row) for row in getUserFriendlyEpisodeSums(db)],
+    }
+    if cacheDir:
+        writeSharedDataSummaries(cacheDir, summaries, start)
+    else:
+        with dataSummariesLock:
+            dataSummaries['version'] = version
+            dataSummaries['summaries'] = summaries
+    return summaries
+
+
+def markDataChanged():
+    '''
+    Support function used after episodes or participants are added to bump
+    the data version, so cached /data summaries are computed again and pages
+    cached by browsers are sent again. Called after the write is committed
+    so the next page view computes summaries that include it. The version is
+    the modified time of a marker file if the DATA_CACHE_DIR env variable is
+    set, otherwise it is kept in the data_version table so every worker
+    sees it.
+
+    Returns:
+        None
+    '''
+    from .models import DataVersion, db
+    with dataSummariesLock:
+        dataSummaries['summaries'] = None
+    cacheDir = environ.get('DATA_CACHE_DIR', '')
+    if cacheDir:
+        makedirs(cacheDir, exist_ok=True)
+        marker = path.join(cacheDir, 'dataVersion')
+        open(marker, 'a').close()
+        utime(marker)
+        return
+    table = DataVersion.__table__
+    if not db.session.execute(table.update().values(
+            modified=time())).rowcount:
+        db.session.execute(table.insert().values(id=1, modified=time()))
+    db.session.commit()
+
+
+def getDataVersion():
+    '''
+    Support function used to get the time the data last changed, shared by
+    every worker. Costs a single primary key lookup, or none if
+    DATA_CACHE_DIR is set.
+
+    Returns:
+        (float): Timestamp of the last markDataChanged.
+    '''
+    from .models import DataVersion, db
+    cacheDir = environ.get('DATA_CACHE_DIR', '')
+    if cacheDir:
+        marker = path.join(cacheDir, 'dataVersion')
+        if not path.exists(marker):
+            markDataChanged()
+        return path.getmtime(marker)
+    modified = db.session.query(DataVersion.modified).scalar()
+    if modified is None:
+        markDataChanged()
+        modified = db.session.query(DataVersion.modified).scalar()
+    return modified
+
+
+def readSharedDataSummaries(cacheDir):
+    '''
+    Support function for getDataSummaries that reads the summaries shared by
+    every worker. They are stale if they were computed before the last
+    change to the data, see markDataChanged.
+
+    Args:
+        cacheDir (str): Directory the summaries are shared through.
+    Returns:
+        (dict): The cached summaries, or None if missing or stale.
+    '''
+    try:
+        invalidated = path.getmtime(
+            path.join(cacheDir, 'dataVersion'))
+    except OSError:
+        invalidated = 0
+    filepath = path.join(cacheDir, 'dataSummaries.pickle')
+    try:
+        if path.getmtime(filepath) <= invalidated:
+            return None
+        with open(filepath, 'rb') as f:
+            return load(f)
+    except (OSError, EOFError, UnpicklingError):
+        return None
+
+
+def writeSharedDataSummaries(cacheDir, summaries, start):
+    '''
+    Support function for getDataSummaries that shares summaries with every
+    worker. The file's modified time is set to when the summaries started
+    being computed, so summaries racing with a write are treated as stale.
+
+    Args:
+        cacheDir (str): Directory the summaries are shared through.
+        summaries (dict): Summaries from getDataSummaries.
+        start (float): Timestamp the summaries started being computed at.
+    Returns:
+        None
+    '''
+    makedirs(cacheDir, exist_ok=True)
+    fd, tmp_filepath = mkstemp(dir=cacheDir, prefix='.dataSummaries',
+                               suffix='.tmp')
+    with open(fd, 'wb') as f:
+        dump(summaries, f, protocol=HIGHEST_PROTOCOL)
+    utime(tmp_filepath, (start, start))
+    replace(tmp_filepath, path.join(cacheDir, 'dataSummaries.pickle'))
+
+
 def getUserFriendlyRogues(db):
     '''
     Support function to retrieve specific information from multiple tables
@@ -627,10 +1760,10 @@ def getUserFriendlyRogues(db):
     data = db.session.execute('''
     SELECT
         name, rogue_start_date, rogue_end_date,
-        SUM(is_correct) AS correct,
-        COUNT(is_correct)-SUM(is_correct) AS incorrect
+        SUM(correct) AS correct,
+        SUM(incorrect) AS incorrect
     FROM
-        participants, results
+        participants, result_totals
     WHERE
         participants.id = participant_id AND
         is_rogue=1
@@ -655,10 +1788,10 @@ def getUserFriendlyGuests(db):
     data = db.session.execute('''
     SELECT
         name,
-        count(is_correct) AS num_appearances,
-        SUM(is_correct) AS correct,
-        COUNT(is_correct)-SUM(is_correct) AS incorrect
-    FROM participants, results
+        SUM(correct+incorrect) AS num_appearances,
+        SUM(correct) AS correct,
+        SUM(incorrect) AS incorrect
+    FROM participants, result_totals
     WHERE
         participants.id = participant_id AND
         is_rogue=0
@@ -673,7 +1806,7 @@ def getUserFriendlyGuests(db):
 def getUserFriendlyEpisodeData(db):
     '''
     Support function to retrieve specific information from multiple tables
-    regarding Episodes.
+    regarding Episodes. Only episodes with a presenter are included.
 
     Args:
         db (SQLAlchemy db): db object.
@@ -687,11 +1820,7 @@ def getUserFriendlyEpisodeData(db):
     FROM
         episodes AS ep
     JOIN
-        results AS res ON ep.id=res.episode_id
-    JOIN
-        participants AS p on res.participant_id=p.id
-    WHERE
-        res.is_presenter=1
+        participants AS p on ep.presenter_id=p.id
     ORDER BY
         ep_num DESC
     ''')
@@ -700,8 +1829,8 @@ def getUserFriendlyEpisodeData(db):
 
 def getUserFriendlyEpisodeSums(db):
     '''
-    Support function to retrieve specific information from multiple tables
-    regarding totaling information.
+    Support function to retrieve the totals of each episode, in the same
+    order as getUserFriendlyEpisodeData.
 
     Args:
         db (SQLAlchemy db): db object.
@@ -710,17 +1839,15 @@ def getUserFriendlyEpisodeSums(db):
     '''
     sum_data = db.session.execute('''
     SELECT
-        ep.ep_num,
-        SUM(is_correct) AS correct,
-        COUNT(is_correct)-SUM(is_correct) AS incorrect
+        ep_num,
+        num_correct AS correct,
+        num_incorrect AS incorrect
     FROM
-        results AS res
-    JOIN
-        episodes AS ep ON res.episode_id=ep.id
-    GROUP BY
-        episode_id
+        episodes
+    WHERE
+        presenter_id IS NOT NULL
     ORDER BY
-        ep.ep_num DESC
+        ep_num DESC
     ''')
 
     return sum_data.fetchall()
@@ -5,100 +5,601 @@
 # Contains logic to create graphs needed for Science or Fiction app.
 # Also contains supporting functions to simplify certain use-cases
 
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import date
-from os import environ
+from hashlib import sha256
+from json import dumps
+from multiprocessing import get_context
+from os import chmod, environ, path, remove, replace, utime
+from tempfile import mkstemp
+from threading import Lock
+from time import perf_counter, time
 
 import bokeh.palettes as palettes
+import numpy as np
+from bokeh import __version__ as bokehVersion
+from bokeh.embed import components
 from bokeh.models import ColumnDataSource, HoverTool
-from bokeh.plotting import figure, output_file, save
+from bokeh.plotting import figure
 
-from .extensions import getAllEpisodes, getGuests, getRogues
-from .stats import getRogueAccuracy, getRogueOverallAccuracy, getSweeps
+from .extensions import (graphBuildJob, getGuests, getResultTotals,
+                         getRogues)
+from .metrics import observeGraphBuild
+from .models import Results
+from .stats import getAccuraciesOverTime, getAccuracy, getSweepFlags
 
+# bump whenever the contents of the saved graph files change shape so graphs
+# saved in an older format are rebuilt
+GRAPH_FORMAT = 'components-ajax'
 
-def saveGraph(graph, filename):
+
+def saveGraph(graph, filename, fingerprint=None):
     '''
     Writes a given graph to a file in a given location. Location is dictated by
-    the OUTPUT_FILEPATH env variable.
+    the OUTPUT_FILEPATH env variable. Only the graph's div and script are
+    written, BokehJS itself is loaded once by scripts.html. The graph is
+    written to a temporary file first and then moved into place so a page
+    never includes a half-written graph.
 
     Args:
         graph (Bokeh Figure): The desired graph to be written to a file.
         filename (str): The desired name of the saved file.
+        fingerprint (str) - optional: Fingerprint of the data the graph was
+            built from, saved alongside the graph.
+    Returns:
+        None
+    '''
+    script, div = components(graph)
+    writeGraphFile(filename + '.html', div + script)
+    if fingerprint:
+        writeGraphFile(filename + '.sha256', fingerprint)
+
+
+def writeGraphFile(filename, contents):
+    '''
+    Support function for saveGraph that atomically replaces a file in the
+    OUTPUT_FILEPATH folder. mkstemp creates files only their owner can read,
+    so they are opened up to match files written normally.
+
+    Args:
+        filename (str): Name of the file within the folder.
+        contents (str): Contents to write.
     Returns:
         None
     '''
-    filename += '.html'
     output_filepath = environ['OUTPUT_FILEPATH']
-    output_filepath += filename
-    output_file(output_filepath)
-    save(graph)
+    fd, tmp_filepath = mkstemp(dir=output_filepath, prefix='.' + filename,
+                               suffix='.tmp')
+    with open(fd, 'w') as f:
+        f.write(contents)
+    chmod(tmp_filepath, 0o644)
+    replace(tmp_filepath, output_filepath + filename)
+
+
+def getFingerprint(*data):
+    '''
+    Creates a fingerprint of the data a graph is built from so that a graph
+    only needs to be rendered again when its data has changed.
+
+    Args:
+        *data: Name of the graph and the series passed into its
+            ColumnDataSources.
+    Returns:
+        (str): Hash of the given data.
+    '''
+    data = dumps([GRAPH_FORMAT, bokehVersion, data], default=str,
+                 sort_keys=True)
+    return sha256(data.encode()).hexdigest()
+
+
+def graphUpToDate(graph, fingerprint):
+    '''
+    Checks whether a graph exists and was last built from data with the
+    given fingerprint.
+
+    Args:
+        graph (str): Name of the graph.
+        fingerprint (str): Fingerprint of the data the graph would be built
+            from now.
+    Returns:
+        (bool): True if the graph does not need to be built again.
+    '''
+    try:
+        with open(environ['OUTPUT_FILEPATH'] + graph + '.sha256') as f:
+            return f.read() == fingerprint and graphExists(graph)
+    except FileNotFoundError:
+        return False
+
+
+def graphExists(graph):
+    '''
+    Checks whether a graph has already been written to the location dictated
+    by the OUTPUT_FILEPATH env variable.
+
+    Args:
+        graph (str): Name of the graph.
+    Returns:
+        (bool): True if the graph file exists.
+    '''
+    return path.exists(environ['OUTPUT_FILEPATH'] + graph + '.html')
+
+
+def getGraphChecked(graph):
+    '''
+    Gets the time a graph's layout was last checked against the data, i.e.
+    when its last build started. Recorded as the modified time of its
+    fingerprint, see getGraph.
+
+    Args:
+        graph (str): Name of the graph.
+    Returns:
+        (float): Timestamp of the last check, 0 if it has never been built.
+    '''
+    try:
+        return path.getmtime(environ['OUTPUT_FILEPATH'] + graph + '.sha256')
+    except OSError:
+        return 0
+
+
+def graphStale(graph, graphType, graphYear=False, dataVersion=None):
+    '''
+    Checks whether new data may have changed a graph's layout. Graphs are
+    marked dirty by writes in this process, writes through other workers or
+    before a restart are caught by comparing when the graph was last checked
+    with the data version.
+
+    Args:
+        graph (str): Name of the graph.
+        graphType (str): The type of graph.
+        graphYear(str) - optional: The year the graph is built for.
+        dataVersion (float) - optional: Data version from getDataVersion,
+            fetched if not given.
+    Returns:
+        (bool): True if the graph needs to be built again.
+    '''
+    from .extensions import dirtyGraphs, getDataVersion
+    if (graphType, graphYear or 'overall') in dirtyGraphs:
+        return True
+    if dataVersion is None:
+        dataVersion = getDataVersion()
+    return getGraphChecked(graph) < dataVersion
+
+
+def getGraphModified(graph):
+    '''
+    Gets the time a graph was last written, used to tell browsers when a
+    page including it has changed.
 
+    Args:
+        graph (str): Name of the graph.
+    Returns:
+        (float): Timestamp the graph file was last written, 0 if missing.
+    '''
+    try:
+        return path.getmtime(environ['OUTPUT_FILEPATH'] + graph + '.html')
+    except OSError:
+        return 0
 
-def buildAllGraphs(graphTypes, graphYears):
+
+def buildAllGraphs(graphTypes, graphYears, force=False, processes=0,
+                   progress=None):
     '''
     Used primarily to "update" graphs by recreating them with current data.
     Also is used upon app initialization to create graphs needed for display.
+    Only graphs that are missing or have been made stale by new data are
+    rebuilt unless force is set.
 
     Args:
         graphTypes (List[str]): A list of graphtypes to build.
         graphYears (List[date]): A list of dates for graphs to build.
+        force (bool) - optional: Set to True to rebuild every graph.
+        processes (int) - optional: Number of worker processes to build
+            graphs with. Graphs are built serially in this process if set
+            to 0 or 1.
+        progress (function) - optional: Called with (graphType, graphYear,
+            status, duration) as every graph is queued ('pending') and
+            built ('built').
     Returns:
-        None
+        (list): (graphType, graphYear) pairs that were rebuilt.
     '''
+    from flask import current_app
+    from .extensions import dirtyGraphs, getDataVersion
+    dataVersion = getDataVersion()
+    built = []
     for graphType in graphTypes:
         for graphYear in graphYears:
-            getGraph(graphType, graphYear)
+            stale = graphStale(getGraphName(graphType, graphYear), graphType,
+                               graphYear, dataVersion)
+            missing = not graphExists(getGraphName(graphType, graphYear))
+            if force or stale or missing:
+                # cleared before building so writes made while the graph is
+                # being built mark it stale again
+                dirtyGraphs.discard((graphType, graphYear))
+                built.append((graphType, graphYear))
+
+    if not progress:
+        def progress(graphType, graphYear, status, duration=None):
+            pass
+    for graphType, graphYear in built:
+        progress(graphType, graphYear, 'pending')
+
+    if processes > 1 and len(built) > 1:
+        database_uri = current_app.config['SQLALCHEMY_DATABASE_URI']
+        # workers are spawned rather than forked as forking while another
+        # thread holds a db or logging lock leaves the worker deadlocked
+        with ProcessPoolExecutor(max_workers=processes,
+                                 mp_context=get_context('spawn'),
+                                 initializer=initGraphWorker,
+                                 initargs=(database_uri,)) as executor:
+            futures = [executor.submit(buildGraph, graph, force)
+                       for graph in built]
+            for future in as_completed(futures):
+                # result() raises any exception raised in a worker here
+                (graphType, graphYear), duration, rendered = future.result()
+                # workers don't share this process' metrics registry
+                if rendered:
+                    observeGraphBuild(graphType, graphYear, duration)
+                progress(graphType, graphYear, 'built', duration)
+    else:
+        for graph in built:
+            (graphType, graphYear), duration, rendered = buildGraph(
+                graph, force)
+            if rendered:
+                observeGraphBuild(graphType, graphYear, duration)
+            progress(graphType, graphYear, 'built', duration)
+    return built
 
 
-def getGraph(graphType, graphYear=False, graphTheme=False):
+def initGraphWorker(database_uri):
     '''
-    "Controller" for graph-building. Given a graphType ensures that a graph
-    is built.
+    Initializes a graph building worker process with its own app context and,
+    therefore, its own db engine rather than sharing the parent's connections.
 
     Args:
-        graphType (str): The type of graph to build.
-        graphYear(date) - optional: The year to build a graph for.
-        graphTheme(str) - optional: The theme to filter all data in
-            graph building.
+        database_uri (str): SQLAlchemy database uri to build graphs from.
+    Returns:
+        None
+    '''
+    from flask import Flask
+    from .models import db
+    app = Flask('app')
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_uri
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    app.app_context().push()
+
+
+def buildGraph(graph, force=False):
+    '''
+    Builds a single graph. Exists so buildAllGraphs can hand graphs out to
+    worker processes.
+
+    Args:
+        graph (tuple): (graphType, graphYear) pair to build.
+        force (bool) - optional: Set to True to render the graph even if its
+            data has not changed.
+    Returns:
+        (tuple): The (graphType, graphYear) pair, seconds taken to build and
+            whether the graph was rendered.
+    '''
+    graphType, graphYear = graph
+    start = perf_counter()
+    rendered = getGraph(graphType, graphYear, force=force)
+    return graph, perf_counter() - start, rendered
+
+
+# graphs built on demand, least recently used first, mapped to the
+# (graphType, graphYear) they were built for and their size in bytes
+renderedGraphs = OrderedDict()
+renderedGraphsLock = Lock()
+
+
+def ensureGraph(graphType, graphYear=False, graphTheme=False):
+    '''
+    Makes sure a graph exists and is up to date so it can be displayed,
+    building it on demand if it is missing or made stale by new data. Themed
+    graphs are never prebuilt so they are built on first request and kept in
+    a least recently used cache bounded by the GRAPH_CACHE_MAX_GRAPHS and
+    GRAPH_CACHE_MAX_BYTES env variables.
+
+    Args:
+        graphType (str): The type of graph.
+        graphYear(date) - optional: The year the graph is built for.
+        graphTheme(str) - optional: The theme the graph is filtered to.
+    Returns:
+        (bool): True if the graph is ready, False if it is going to be built
+            by the graph build that is currently running.
+    '''
+    from .extensions import dirtyGraphs
+    graph = getGraphName(graphType, graphYear, graphTheme)
+    stale = graphStale(graph, graphType, graphYear)
+    if graphTheme:
+        # themed graphs left behind by an earlier run may be stale so only
+        # graphs this cache knows about are reused
+        with renderedGraphsLock:
+            if graph in renderedGraphs and graphExists(graph) and not stale:
+                renderedGraphs.move_to_end(graph)
+                return True
+    elif graphExists(graph):
+        if not stale:
+            return True
+    elif graphBuildJob['running']:
+        return False
+
+    if not graphTheme:
+        # cleared before building, as in buildAllGraphs
+        dirtyGraphs.discard((graphType, graphYear or 'overall'))
+    start = perf_counter()
+    if getGraph(graphType, graphYear, graphTheme):
+        observeGraphBuild(graphType, graphYear, perf_counter() - start)
+    if graphTheme:
+        size = path.getsize(environ['OUTPUT_FILEPATH'] + graph + '.html')
+        with renderedGraphsLock:
+            renderedGraphs[graph] = ((graphType, graphYear or 'overall'),
+                                     size)
+            renderedGraphs.move_to_end(graph)
+            evictGraphs()
+    return True
+
+
+def evictGraphs(graphYears=False, graphTypes=False):
+    '''
+    Removes graphs built on demand. Given graph years and types, every cached
+    graph for them is removed as it is now stale. Otherwise the least recently
+    used graphs are removed until the cache is back within its bounds.
+    Should be called while holding renderedGraphsLock.
+
+    Args:
+        graphYears (list) - optional: Years (or 'overall') that are stale.
+        graphTypes (list[str]) - optional: Graph types that are stale.
+    Returns:
+        None
+    '''
+    if graphYears and graphTypes:
+        stale = [graph for graph, (key, size) in renderedGraphs.items()
+                 if key[0] in graphTypes and key[1] in graphYears]
+    else:
+        maxGraphs = int(environ['GRAPH_CACHE_MAX_GRAPHS'])
+        maxBytes = int(environ['GRAPH_CACHE_MAX_BYTES'])
+        numGraphs = len(renderedGraphs)
+        numBytes = sum(size for key, size in renderedGraphs.values())
+        stale = []
+        for graph, (key, size) in renderedGraphs.items():
+            if numGraphs <= maxGraphs and numBytes <= maxBytes:
+                break
+            stale.append(graph)
+            numGraphs -= 1
+            numBytes -= size
+
+    for graph in stale:
+        del renderedGraphs[graph]
+        for extension in ['.html', '.sha256']:
+            try:
+                remove(environ['OUTPUT_FILEPATH'] + graph + extension)
+            except FileNotFoundError:
+                pass
+
+
+def getGraphName(graphType, graphYear=False, graphTheme=False):
+    '''
+    Gives the name a graph is saved under for a given set of parameters.
+
+    Args:
+        graphType (str): The type of graph.
+        graphYear(date) - optional: The year the graph is built for.
+        graphTheme(str) - optional: The theme the graph is filtered to.
     Returns:
         (str): Name of graph based on parameters.
     '''
     graph = graphType
-    if graphYear == '':
-        daterange = False
-    elif graphYear == 'overall':
-        daterange = False
-    else:
-        startDate = date(int(graphYear), 1, 1)
-        endDate = date(int(graphYear), 12, 31)
-        daterange = (startDate, endDate)
+    if graphYear and graphYear != 'overall':
         graph += graphYear
     if graphTheme:
         graph += graphTheme
+    return graph
+
+
+def getDaterange(graphYear=False):
+    '''
+    Converts a graph year into the daterange graph data is filtered to.
+
+    Args:
+        graphYear(str) - optional: The year a graph is built for.
+    Returns:
+        (tuple): Start and end date of the year or False for overall.
+    '''
+    if not graphYear or graphYear == 'overall':
+        return False
+    startDate = date(int(graphYear), 1, 1)
+    endDate = date(int(graphYear), 12, 31)
+    return (startDate, endDate)
+
+
+def getGraph(graphType, graphYear=False, graphTheme=False, force=False):
+    '''
+    "Controller" for graph-building. Given a graphType ensures that a graph
+    is built. Graphs are saved without their data, see getGraphData.
+    Rendering is skipped if the graph's layout has not changed since it was
+    last built, either way the graph is recorded as checked against the
+    data.
+
+    Args:
+        graphType (str): The type of graph to build.
+        graphYear(date) - optional: The year to build a graph for.
+        graphTheme(str) - optional: The theme to filter all data in
+            graph building.
+        force (bool) - optional: Set to True to render the graph even if its
+            layout has not changed.
+    Returns:
+        (bool): True if the graph was rendered, False if rendering was
+            skipped.
+    '''
+    checked = time()
+    graph = getGraphName(graphType, graphYear, graphTheme)
+    daterange = getDaterange(graphYear)
+    rendered = False
     if graphType == 'overallAccuracy':
-        graphRogueOverallAccuracies(graph, daterange=daterange,
-                                    theme=graphTheme)
+        rendered = graphRogueOverallAccuracies(graph, daterange=daterange,
+                                               force=force)
     elif graphType == 'accuracyOverTime':
-        graphRogueAccuracies(graph, daterange=daterange, theme=graphTheme)
+        rendered = graphRogueAccuracies(graph, daterange=daterange,
+                                        theme=graphTheme, force=force)
     elif graphType == 'sweeps':
-        graphSweeps(graph, daterange=daterange)
-    return graph
+        rendered = graphSweeps(graph, force=force)
+    # set to when the build started so writes made while building leave the
+    # graph stale, see graphStale
+    fingerprint = environ['OUTPUT_FILEPATH'] + graph + '.sha256'
+    if path.exists(fingerprint):
+        utime(fingerprint, (checked, checked))
+    return rendered
+
+
+def getGraphData(graphType, graphYear=False, graphTheme=False):
+    '''
+    Gets the data shown in a graph. The browser fetches this from the /api
+    routes and fills in the graph's ColumnDataSources, so new data shows up
+    without rebuilding any graphs.
+
+    Args:
+        graphType (str): The type of graph to get data for.
+        graphYear(date) - optional: The year to get data for.
+        graphTheme(str) - optional: The theme to filter all data to.
+    Returns:
+        (dict): Name of each ColumnDataSource in the graph mapped to its
+            columns. Dates are milliseconds since the epoch.
+    '''
+    daterange = getDaterange(graphYear)
+    if graphType == 'overallAccuracy':
+        return {'overallAccuracy': getOverallAccuracyData(daterange,
+                                                          graphTheme)}
+    elif graphType == 'accuracyOverTime':
+        return {name: columns for name, is_rogue, columns
+                in getAccuracyOverTimeData(daterange, graphTheme)}
+    elif graphType == 'sweeps':
+        return getSweepsData(daterange)
+
+
+def getTimestamps(dates):
+    '''
+    Converts dates into the milliseconds since the epoch BokehJS expects on a
+    datetime axis.
+
+    Args:
+        dates (list or numpy.ndarray): Dates to convert.
+    Returns:
+        (list[int]): Milliseconds since the epoch.
+    '''
+    return np.array(dates, dtype='datetime64[ms]').astype('int64').tolist()
+
+
+def getOverallAccuracyData(daterange=False, theme=False):
+    '''
+    Gets the columns for an Overall Accuracy bar graph.
+
+    Args:
+        daterange (List or Tuple) - optional: Filter data down to a date
+            range.
+        theme (str) - optional: Filter data down to a particular theme.
+    Returns:
+        (dict): Columns for the graph's ColumnDataSource.
+    '''
+    colors = palettes.Set3[12]
+    # every rogue's totals from a single grouped query
+    totals = getResultTotals(groupBy=Results.participant_id,
+                             daterange=daterange, theme=theme)
+    x = []
+    y = []
+    correct = []
+    incorrect = []
+    for rogue in getRogues(daterange=daterange):
+        accuracy, num_correct, num_incorrect = getAccuracy(
+            *totals.get(rogue.id, (0, 0)))
+        accuracy = accuracy*100
+        x.append(rogue.name)
+        y.append(accuracy)
+        correct.append(num_correct)
+        incorrect.append(num_incorrect)
+    return dict(x=x, y=y, correct=correct, incorrect=incorrect,
+                color=[colors[i % len(colors)] for i in range(len(x))])
+
+
+def getAccuracyOverTimeData(daterange=False, theme=False):
+    '''
+    Gets the columns for each line of an accumulated accuracy over time line
+    graph.
+
+    Args:
+        daterange (List or Tuple) - optional: Filter data down to a date
+            range.
+        theme (str) - optional: Filter data down to a particular theme.
+    Returns:
+        (list[tuple]): (name, is_rogue, columns) for each participant, rogues
+            first.
+    '''
+    # one query for every participant's series rather than one per episode
+    allAccuracies = getAccuraciesOverTime(daterange=daterange, theme=theme)
+    rogues = getRogues(daterange=daterange)
+    # guests are only shown if they took part within the daterange
+    guests = [guest for guest in getGuests()
+              if guest.name in allAccuracies]
+    series = []
+    for participant in rogues + guests:
+        x, accuracies = allAccuracies.get(participant.name, ([], []))
+        y = [accuracy*100 for accuracy in accuracies]
+        columns = dict(x=getTimestamps(x), y=y,
+                       name=[participant.name for r in range(len(x))])
+        series.append((participant.name, participant.is_rogue, columns))
+    return series
+
+
+def getSweepsData(daterange=False):
+    '''
+    Gets the columns for each line of an accumulated number of sweeps over
+    time line graph.
+
+    Args:
+        daterange (List or Tuple) - optional: Filter data down to a date
+            range.
+    Returns:
+        (dict): Name of each line's ColumnDataSource mapped to its columns.
+    '''
+    # running sweep totals per episode straight from a single aggregate
+    sweeps = getSweepFlags(daterange=daterange, cumulative=True)
+    x = getTimestamps(sweeps['date'])
+    return {
+        'presenterSweeps': dict(
+            x=x, y=sweeps['presenter'].tolist(),
+            label=['Presenter Sweeps' for r in range(len(x))]),
+        'participantSweeps': dict(
+            x=x, y=sweeps['participant'].tolist(),
+            label=['Participant Sweeps' for r in range(len(x))]),
+    }
 
 
 def graphRogueOverallAccuracies(saveTo='graph', daterange=False,
-                                theme=False):
+                                force=False):
     '''
-    Used specifically to create an Overall Accuracy bar graph.
+    Used specifically to create an Overall Accuracy bar graph. Its data is
+    filled in by the browser from getOverallAccuracyData.
 
     Args:
         saveTo (str): Filename for graph.
         daterange (List or Tuple) - optional: Filter data for graphs down to
             a date range.
-        theme (str) - optional: Filter data for graphs down to a particular
-            theme.
+        force (bool) - optional: Set to True to render the graph even if its
+            layout has not changed.
     Returns:
-        None
+        (bool): True if the graph was rendered, False if rendering was
+            skipped.
     '''
+    rogues = getRogues(onlyNames=True, daterange=daterange)
+
+    # skip rendering entirely if the layout is the same as the last build
+    fingerprint = getFingerprint(saveTo, rogues)
+    if not force and graphUpToDate(saveTo, fingerprint):
+        return False
+
     hovertool = HoverTool(
         tooltips='''
 <div class="container-fluid">
@@ -113,29 +614,12 @@ def graphRogueOverallAccuracies(saveTo='graph', daterange=False,
 </div>
 ''')
 
-    x = []
-    y = []
-    correct = []
-    incorrect = []
-    for rogue in getRogues(onlyNames=True, daterange=daterange):
-        rogueOverallAccuracy = getRogueOverallAccuracy(
-            rogue,
-            daterange=daterange,
-            theme=theme)
-        accuracy, num_correct, num_incorrect = rogueOverallAccuracy
-        accuracy = accuracy*100
-        x.append(rogue)
-        y.append(accuracy)
-        correct.append(num_correct)
-        incorrect.append(num_incorrect)
-
     tools = [hovertool, 'pan', 'wheel_zoom', 'save', 'reset']
     source = ColumnDataSource(data=dict(
-        x=x, y=y, correct=correct, incorrect=incorrect,
-        color=palettes.Set3[len(x)]
-    ))
+        x=[], y=[], correct=[], incorrect=[], color=[]
+    ), name='overallAccuracy')
     p = figure(title="Rogue Accuracies",
-               x_range=x,
+               x_range=rogues,
                y_range=(0, 100),
                y_axis_label='Percent Correct',
                sizing_mode='stretch_both',
@@ -149,13 +633,16 @@ def graphRogueOverallAccuracies(saveTo='graph', daterange=False,
     p.vbar(x='x', top='y', width=0.5, color='color',
            alpha=0.75, source=source)
 
-    saveGraph(p, saveTo)
+    saveGraph(p, saveTo, fingerprint)
+    return True
 
 
-def graphRogueAccuracies(saveTo='graph', theme=False, daterange=False):
+def graphRogueAccuracies(saveTo='graph', theme=False, daterange=False,
+                         force=False):
     '''
     Used specifically to create an accumulated rogue accuracy over time
-    line graph.
+    line graph. Its data is filled in by the browser from
+    getAccuracyOverTimeData.
 
     Args:
         saveTo (str): Filename for graph.
@@ -163,9 +650,20 @@ def graphRogueAccuracies(saveTo='graph', theme=False, daterange=False):
             a date range.
         theme (str) - optional: Filter data for graphs down to a particular
             theme.
+        force (bool) - optional: Set to True to render the graph even if its
+            layout has not changed.
     Returns:
-        None
+        (bool): True if the graph was rendered, False if rendering was
+            skipped.
     '''
+    participants = [(name, is_rogue) for name, is_rogue, columns
+                    in getAccuracyOverTimeData(daterange, theme)]
+
+    # skip rendering entirely if the layout is the same as the last build
+    fingerprint = getFingerprint(saveTo, participants)
+    if not force and graphUpToDate(saveTo, fingerprint):
+        return False
+
     hovertool = HoverTool(
         mode='vline',
         line_policy='nearest',
@@ -198,43 +696,36 @@ def graphRogueAccuracies(saveTo='graph', theme=False, daterange=False):
                active_inspect=hovertool,
                active_scroll="wheel_zoom")
 
-    rogues = getRogues(daterange=daterange)
-    guests = getGuests(daterange=daterange)
-    participants = rogues + guests
-    for i, participant in enumerate(participants):
-        accuracies = getRogueAccuracy(
-            participant.name, theme=theme, daterange=daterange)
-        x = []
-        y = []
-        color = colors[i]
-        for episode, accuracy in accuracies:
-            accuracy *= 100
-            x.append(episode.date)
-            y.append(accuracy)
-        source = ColumnDataSource(data=dict(
-            x=x, y=y,
-            name=[participant.name for r in range(len(x))],
-        ))
-        p.line(x='x', y='y', legend_label=participant.name, line_color=color,
+    for i, (name, is_rogue) in enumerate(participants):
+        color = colors[i % len(colors)]
+        source = ColumnDataSource(data=dict(x=[], y=[], name=[]), name=name)
+        p.line(x='x', y='y', legend_label=name, line_color=color,
                line_width=4, alpha=0.75, source=source,
-               visible=participant.is_rogue)
+               visible=is_rogue)
 
     p.legend.click_policy = "hide"
-    saveGraph(p, saveTo)
+    saveGraph(p, saveTo, fingerprint)
+    return True
 
 
-def graphSweeps(saveTo='graph', daterange=False):
+def graphSweeps(saveTo='graph', force=False):
     '''
     Used specifically to create an accumulated number of sweeps over time
-    line graph.
+    line graph. Its data is filled in by the browser from getSweepsData.
 
     Args:
         saveTo (str): Filename for graph.
-        daterange (List or Tuple) - optional: Filter data for graphs down to
-            a date range.
+        force (bool) - optional: Set to True to render the graph even if it
+            already exists.
     Returns:
-        None
+        (bool): True if the graph was rendered, False if rendering was
+            skipped.
     '''
+    # the layout never changes so the graph only needs rendering once
+    fingerprint = getFingerprint(saveTo)
+    if not force and graphUpToDate(saveTo, fingerprint):
+        return False
+
     colors = palettes.Set3[12]
 
     hovertool = HoverTool(
@@ -272,46 +763,17 @@ def graphSweeps(saveTo='graph', daterange=False):
                active_inspect=hovertool,
                active_scroll='wheel_zoom')
 
-    allPresenterSweeps = getSweeps(presenter=True, daterange=daterange)
-    allparticipantSweeps = getSweeps(participant=True, daterange=daterange)
-    episodes = getAllEpisodes(daterange=daterange)
-
-    presenterSweeps = []
-    numPresenterSweeps = 0
-    participantSweeps = []
-    numParticipantSweeps = 0
-    for episode in episodes:
-        if episode in allPresenterSweeps:
-            numPresenterSweeps += 1
-        elif episode in allparticipantSweeps:
-            numParticipantSweeps += 1
-        presenterSweeps.append((episode, numPresenterSweeps))
-        participantSweeps.append((episode, numParticipantSweeps))
-
-    x = []
-    y = []
-    for episode, numSweeps in presenterSweeps:
-        x.append(episode.date)
-        y.append(numSweeps)
     color = colors[0]
-    source = ColumnDataSource(data=dict(
-        x=x, y=y,
-        label=['Presenter Sweeps' for r in range(len(x))],
-    ))
+    source = ColumnDataSource(data=dict(x=[], y=[], label=[]),
+                              name='presenterSweeps')
     p.line(x='x', y='y', legend_label='Presenter Sweeps',
            line_width=4, color=color, alpha=0.75, source=source)
 
-    x = []
-    y = []
-    for episode, numSweeps in participantSweeps:
-        x.append(episode.date)
-        y.append(numSweeps)
     color = colors[1]
-    source = ColumnDataSource(data=dict(
-        x=x, y=y,
-        label=['Participant Sweeps' for r in range(len(x))],
-    ))
+    source = ColumnDataSource(data=dict(x=[], y=[], label=[]),
+                              name='participantSweeps')
     p.line(x='x', y='y', legend_label='Participant Sweeps',
            line_width=4, color=color, alpha=0.75, source=source)
 
-    saveGraph(p, saveTo)
+    saveGraph(p, saveTo, fingerprint)
+    return True
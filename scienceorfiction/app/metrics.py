@@ -0,0 +1,201 @@
+# metrics.py
+# Created by: Michael Cole
+# Updated by: Michael Cole
+# -----------------------------
+# In-process metrics registry exposed in the Prometheus text format at
+# /metrics. Turned on with the METRICS_ENABLED env variable, when off no
+# hooks are registered and nothing is recorded.
+
+from bisect import bisect_left
+from os import environ
+from threading import Lock
+from time import perf_counter
+
+from flask import g, request
+
+# set by init_metrics
+enabled = False
+
+# every metric, in the order they are exposed
+registry = []
+
+
+class Counter:
+    '''
+    A count of events, split by label values.
+    '''
+
+    def __init__(self, name, description, labelnames=()):
+        '''
+        Initialize a Counter and add it to the registry.
+        '''
+        self.name = name
+        self.description = description
+        self.labelnames = labelnames
+        self.values = {}
+        self.lock = Lock()
+        registry.append(self)
+
+    def inc(self, *labels, amount=1):
+        '''
+        Increments the count for the given label values.
+        '''
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def expose(self):
+        '''
+        Returns the counter in the Prometheus text format.
+        '''
+        lines = [f'# HELP {self.name} {self.description}',
+                 f'# TYPE {self.name} counter']
+        with self.lock:
+            for labels, value in sorted(self.values.items()):
+                lines.append(f'{self.name}'
+                             f'{formatLabels(self.labelnames, labels)} '
+                             f'{value}')
+        return '\n'.join(lines) + '\n'
+
+
+class Histogram:
+    '''
+    Observed durations sorted into buckets, split by label values. Quantiles
+    such as p95 are estimated from the buckets by the scraper, e.g. with
+    Prometheus' histogram_quantile.
+    '''
+
+    def __init__(self, name, description, labelnames=(),
+                 buckets=(.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)):
+        '''
+        Initialize a Histogram and add it to the registry.
+        '''
+        self.name = name
+        self.description = description
+        self.labelnames = labelnames
+        self.buckets = sorted(buckets)
+        # label values mapped to [count per bucket + overflow, sum]
+        self.values = {}
+        self.lock = Lock()
+        registry.append(self)
+
+    def observe(self, value, *labels):
+        '''
+        Records a single observation for the given label values.
+        '''
+        bucket = bisect_left(self.buckets, value)
+        with self.lock:
+            counts = self.values.get(labels)
+            if counts is None:
+                counts = self.values[labels] = [
+                    [0] * (len(self.buckets) + 1), 0]
+            counts[0][bucket] += 1
+            counts[1] += value
+
+    def expose(self):
+        '''
+        Returns the histogram in the Prometheus text format.
+        '''
+        lines = [f'# HELP {self.name} {self.description}',
+                 f'# TYPE {self.name} histogram']
+        with self.lock:
+            for labels, (counts, total) in sorted(self.values.items()):
+                cumulative = 0
+                bounds = [str(bound) for bound in self.buckets] + ['+Inf']
+                for bound, count in zip(bounds, counts):
+                    cumulative += count
+                    bucketLabels = formatLabels(
+                        self.labelnames + ('le',), labels + (bound,))
+                    lines.append(f'{self.name}_bucket{bucketLabels} '
+                                 f'{cumulative}')
+                labels = formatLabels(self.labelnames, labels)
+                lines.append(f'{self.name}_sum{labels} {total}')
+                lines.append(f'{self.name}_count{labels} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+
+def formatLabels(labelnames, labels):
+    '''
+    Formats label names and values as a Prometheus label set.
+
+    Args:
+        labelnames (tuple[str]): Names of the labels.
+        labels (tuple): Values of the labels.
+    Returns:
+        (str): Label set, e.g. {endpoint="index"}, or an empty string.
+    '''
+    if not labelnames:
+        return ''
+    pairs = []
+    for name, value in zip(labelnames, labels):
+        value = str(value).replace('\\', '\\\\').replace(
+            '"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+requestsTotal = Counter(
+    'sof_requests_total', 'Requests handled.',
+    ('endpoint', 'method', 'status'))
+requestDuration = Histogram(
+    'sof_request_duration_seconds', 'Time taken to handle a request.',
+    ('endpoint', 'method'))
+graphBuildDuration = Histogram(
+    'sof_graph_build_duration_seconds', 'Time taken to build a graph.',
+    ('graph_type', 'graph_year'),
+    buckets=(.05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60))
+
+
+def init_metrics(app):
+    '''
+    Registers request hooks that record the latency of every request. Does
+    nothing unless METRICS_ENABLED is set.
+
+    Args:
+        app (Flask App): App to record metrics for.
+    Returns:
+        None
+    '''
+    global enabled
+    if not int(environ['METRICS_ENABLED']):
+        return
+    enabled = True
+
+    @app.before_request
+    def startTimer():
+        g.metricsStart = perf_counter()
+
+    @app.after_request
+    def recordRequest(response):
+        if 'metricsStart' not in g:
+            return response
+        endpoint = request.endpoint or '<unmatched>'
+        requestDuration.observe(perf_counter() - g.metricsStart,
+                                endpoint, request.method)
+        requestsTotal.inc(endpoint, request.method, response.status_code)
+        return response
+
+
+def observeGraphBuild(graphType, graphYear, seconds):
+    '''
+    Records how long a graph took to build, if metrics are enabled.
+
+    Args:
+        graphType (str): The type of graph built.
+        graphYear (str): The year the graph was built for.
+        seconds (float): Time taken to build the graph.
+    Returns:
+        None
+    '''
+    if enabled:
+        graphBuildDuration.observe(seconds, graphType,
+                                   graphYear or 'overall')
+
+
+def getMetricsText():
+    '''
+    Returns every metric in the registry in the Prometheus text format, or
+    None if metrics are disabled.
+    '''
+    if not enabled:
+        return None
+    return ''.join(metric.expose() for metric in registry)
@@ -40,13 +40,37 @@ class Episodes(db.Model):
                        nullable=False)
 
     date = db.Column(db.Date,
-                     nullable=False)
+                     nullable=False,
+                     index=True)
 
     num_items = db.Column(db.Integer)
 
     theme = db.Column(db.String(50),
                       unique=False,
-                      nullable=True)
+                      nullable=True,
+                      index=True)
+
+    # totals of the episode's results, kept up to date as they are added so
+    # the episode summaries and sweeps don't have to total results. NULL
+    # until filled in by updateEpisodeSummaries, see extensions
+    num_correct = db.Column(db.Integer,
+                            nullable=True)
+
+    num_incorrect = db.Column(db.Integer,
+                              nullable=True)
+
+    num_absent = db.Column(db.Integer,
+                           nullable=True)
+
+    presenter_id = db.Column(db.Integer,
+                             db.ForeignKey('participants.id'),
+                             nullable=True)
+
+    presenter_sweep = db.Column(db.Boolean,
+                                nullable=True)
+
+    participant_sweep = db.Column(db.Boolean,
+                                  nullable=True)
 
     results = db.relationship('Results',
                               backref='episode',
@@ -128,9 +152,17 @@ class Results(db.Model):
     '''
     SQLAlchemy model for the results table in the db.
     '''
+    # results are almost always looked up by participant, usually within
+    # a set of episodes
+    __table_args__ = (
+        db.Index('ix_results_participant_id_episode_id',
+                 'participant_id', 'episode_id'),
+    )
+
     id = db.Column(db.Integer,
                    primary_key=True)
 
+    # not indexed here, InnoDB already indexes every foreign key column
     episode_id = db.Column(db.Integer,
                            db.ForeignKey('episodes.id'),
                            nullable=False)
@@ -155,19 +187,36 @@ class Results(db.Model):
         '''
         self.episode_id = episode_id
         self.participant_id = rogue_id
-        self.is_correct = None
-        self.is_absent = 0
+        outcome = Results.getOutcome(is_correct)
+        self.is_correct = outcome['is_correct']
+        self.is_absent = outcome['is_absent']
+        if outcome['is_presenter']:
+            self.is_presenter = 1
 
+    @staticmethod
+    def getOutcome(is_correct):
+        '''
+        Converts a result from the admin form or test data into column values.
+        Shared with the bulk loader, which inserts rows without creating
+        Result objects.
+
+        Args:
+            is_correct (str): One of 'correct', 'incorrect', 'absent' or
+                'presenter'.
+        Returns:
+            (dict): Values for the is_correct, is_absent and is_presenter
+                columns.
+        '''
+        outcome = {'is_correct': None, 'is_absent': 0, 'is_presenter': 0}
         if is_correct == 'correct':
-            self.is_correct = 1
+            outcome['is_correct'] = 1
         elif is_correct == 'incorrect':
-            self.is_correct = 0
+            outcome['is_correct'] = 0
         elif is_correct == 'absent':
-            self.is_correct = None
-            self.is_absent = 1
+            outcome['is_absent'] = 1
         elif is_correct == 'presenter':
-            self.is_correct = None
-            self.is_presenter = 1
+            outcome['is_presenter'] = 1
+        return outcome
 
     def __repr__(self):
         '''
@@ -176,6 +225,59 @@ class Results(db.Model):
         return f'rogue_id={self.participant_id}|is_correct={self.is_correct}'
 
 
+class ResultTotals(db.Model):
+    '''
+    SQLAlchemy model for the result_totals table in the db. A rollup of the
+    results table totalled by participant, year and theme, kept up to date
+    in the same transaction results are added in so totals never have to be
+    counted from every result. See extensions.addResultTotals.
+    '''
+    __tablename__ = 'result_totals'
+    __table_args__ = (
+        db.UniqueConstraint('participant_id', 'year', 'theme',
+                            name='uq_result_totals_participant_year_theme'),
+    )
+
+    id = db.Column(db.Integer,
+                   primary_key=True)
+
+    participant_id = db.Column(db.Integer,
+                               db.ForeignKey('participants.id'),
+                               nullable=False)
+
+    year = db.Column(db.Integer,
+                     nullable=False)
+
+    # episodes without a theme are totalled under ''
+    theme = db.Column(db.String(50),
+                      nullable=False,
+                      default='')
+
+    correct = db.Column(db.Integer,
+                        nullable=False,
+                        default=0)
+
+    incorrect = db.Column(db.Integer,
+                          nullable=False,
+                          default=0)
+
+    absent = db.Column(db.Integer,
+                       nullable=False,
+                       default=0)
+
+    presenter = db.Column(db.Integer,
+                          nullable=False,
+                          default=0)
+
+    def __repr__(self):
+        '''
+        Print Formatting.
+        '''
+        return (f'participant_id={self.participant_id}|year={self.year}|'
+                f'theme={self.theme}|correct={self.correct}|'
+                f'incorrect={self.incorrect}')
+
+
 class Admins(db.Model):
     '''
     SQLAlchemy model for the admins table in the db.
@@ -245,3 +347,26 @@ class Admins(db.Model):
         admin.
         '''
         return self.id
+
+
+class DataVersion(db.Model):
+    '''
+    SQLAlchemy model for the data_version table in the db. A single row
+    holding the time episodes or participants were last added, so every
+    worker agrees on the data version pages are cached against, and the
+    progress of the latest graph build. See extensions.markDataChanged.
+    Stored in double precision, a single precision timestamp only changes
+    every couple of minutes.
+    '''
+    __tablename__ = 'data_version'
+
+    id = db.Column(db.Integer,
+                   primary_key=True)
+
+    modified = db.Column(db.Float(precision=53),
+                         nullable=False)
+
+    # progress of the most recent background graph build as JSON, see
+    # extensions.saveGraphBuildStatus
+    graph_build = db.Column(db.Text,
+                            nullable=True)
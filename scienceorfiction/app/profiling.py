@@ -0,0 +1,136 @@
+# profiling.py
+# Created by: Michael Cole
+# Updated by: Michael Cole
+# -----------------------------
+# Opt-in instrumentation of the SQL run by each request. Turned on with
+# the SQL_PROFILING env variable.
+
+from os import environ
+from threading import Lock
+from time import perf_counter
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+# number of slowest statements kept per request and overall
+SLOWEST_STATEMENTS = 5
+
+# aggregates per endpoint since startup
+profilingStats = {'enabled': False, 'endpoints': {}, 'slowest': []}
+profilingStatsLock = Lock()
+
+
+def init_profiling(app, db):
+    '''
+    Hooks into the SQLAlchemy engine and the request cycle to record the
+    number of queries, total database time and slowest statements of each
+    request. Requests slower than SQL_PROFILING_SLOW_REQUEST_MS are logged.
+    Does nothing unless SQL_PROFILING is set.
+
+    Args:
+        app (Flask App): App to instrument, with an app context pushed.
+        db (SQLAlchemy): db object from .models
+    Returns:
+        None
+    '''
+    if not int(environ['SQL_PROFILING']):
+        return
+    profilingStats['enabled'] = True
+    threshold = float(environ['SQL_PROFILING_SLOW_REQUEST_MS']) / 1000
+
+    @event.listens_for(db.engine, 'before_cursor_execute')
+    def startQuery(conn, cursor, statement, parameters, context,
+                   executemany):
+        conn.info.setdefault('query_start', []).append(perf_counter())
+
+    @event.listens_for(db.engine, 'after_cursor_execute')
+    def endQuery(conn, cursor, statement, parameters, context, executemany):
+        duration = perf_counter() - conn.info['query_start'].pop()
+        # graph builds in the background have no request to charge
+        if not has_request_context() or 'sqlQueries' not in g:
+            return
+        g.sqlQueries += 1
+        g.sqlTime += duration
+        # raw SQL summaries span many lines, keep statements on one line
+        g.sqlSlowest.append((duration, ' '.join(statement.split())))
+        g.sqlSlowest.sort(reverse=True)
+        del g.sqlSlowest[SLOWEST_STATEMENTS:]
+
+    @app.before_request
+    def startRequest():
+        g.requestStart = perf_counter()
+        g.sqlQueries = 0
+        g.sqlTime = 0
+        g.sqlSlowest = []
+
+    @app.after_request
+    def endRequest(response):
+        if 'requestStart' not in g:
+            return response
+        duration = perf_counter() - g.requestStart
+        recordRequest(request.endpoint or '<unmatched>', duration,
+                      g.sqlQueries, g.sqlTime, g.sqlSlowest)
+        if duration > threshold:
+            slowest = g.sqlSlowest[0][1] if g.sqlSlowest else None
+            app.logger.warning(
+                f'Slow request {request.method} {request.full_path} '
+                f'{duration * 1000:.0f}ms, {g.sqlQueries} queries in '
+                f'{g.sqlTime * 1000:.0f}ms. Slowest statement: {slowest}')
+        return response
+
+
+def recordRequest(endpoint, duration, queries, sqlTime, slowest):
+    '''
+    Adds a request's measurements to the aggregates for its endpoint.
+
+    Args:
+        endpoint (str): Name of the endpoint that handled the request.
+        duration (float): Seconds taken to handle the request.
+        queries (int): Number of queries the request ran.
+        sqlTime (float): Seconds spent running those queries.
+        slowest (list[tuple]): (seconds, statement) of the request's slowest
+            statements.
+    Returns:
+        None
+    '''
+    with profilingStatsLock:
+        stats = profilingStats['endpoints'].setdefault(endpoint, {
+            'requests': 0, 'queries': 0, 'maxQueries': 0, 'sqlTime': 0,
+            'time': 0, 'maxTime': 0,
+        })
+        stats['requests'] += 1
+        stats['queries'] += queries
+        stats['maxQueries'] = max(stats['maxQueries'], queries)
+        stats['sqlTime'] += sqlTime
+        stats['time'] += duration
+        stats['maxTime'] = max(stats['maxTime'], duration)
+
+        overall = profilingStats['slowest']
+        overall.extend((seconds, statement, endpoint)
+                       for seconds, statement in slowest)
+        overall.sort(key=lambda query: query[0], reverse=True)
+        del overall[SLOWEST_STATEMENTS:]
+
+
+def getProfilingStats():
+    '''
+    Support function used to report the SQL profiling aggregates.
+
+    Returns:
+        (dict): Whether profiling is enabled, totals and averages for each
+            endpoint and the slowest statements run since startup.
+    '''
+    with profilingStatsLock:
+        endpoints = {}
+        for endpoint, stats in profilingStats['endpoints'].items():
+            endpoints[endpoint] = dict(
+                stats,
+                avgQueries=stats['queries'] / stats['requests'],
+                avgSqlTime=stats['sqlTime'] / stats['requests'],
+                avgTime=stats['time'] / stats['requests'])
+        slowest = [{'seconds': seconds, 'statement': statement,
+                    'endpoint': endpoint}
+                   for seconds, statement, endpoint
+                   in profilingStats['slowest']]
+    return {'enabled': profilingStats['enabled'], 'endpoints': endpoints,
+            'slowest': slowest}
@@ -6,22 +6,37 @@
 # (and lots of logic for now).
 
 from datetime import date, datetime
+from hashlib import sha256
+from json import dumps, loads
+from os import path
 from threading import Thread
+from time import time
 
-from flask import redirect, render_template, request, url_for
+from bokeh import __version__ as bokehVersion
+from bokeh.util.paths import bokehjsdir
+from flask import (Response, abort, jsonify, make_response, redirect,
+                   render_template, request, send_from_directory, session,
+                   stream_with_context, url_for)
 from flask_login import current_user, login_required, login_user, logout_user
 from flask_wtf import FlaskForm
-
-from .extensions import (addAdmin, addEpisode, addParticipant,
-                         check_authentication, email_secret_code, encrypt,
-                         generate_secret_code, getAdmin, getAllEpisodes,
-                         getAllParticipants, getAllResults, getGuests,
-                         getRogues, getThemes, getUserFriendlyEpisodeData,
-                         getUserFriendlyEpisodeSums, getUserFriendlyGuests,
-                         getUserFriendlyRogues, getYears)
+from flask_wtf.csrf import generate_csrf
+
+from .export import (EXPORT_DATASETS, EXPORT_FORMATS, queryExport,
+                     streamExport)
+from .extensions import (ADMIN_TABLES, GRAPH_TYPES, addAdmin, addEpisode,
+                         addParticipant, check_authentication,
+                         email_secret_code, encrypt, generate_secret_code,
+                         getAdmin, getAllParticipants, getDataSummaries,
+                         getDataVersion, getGraphBuildStatus, getGuests,
+                         getNextEpNum, getParticipant, getRogues,
+                         getTablePage, getThemes, getYears, startGraphBuild)
 from .forms import (AddEntryForm, AddParticipantForm, AdminAuthenticateForm,
                     AdminCreateForm, AdminLoginForm)
+from .graphs import (ensureGraph, getDaterange, getGraphData,
+                     getGraphModified, getGraphName)
+from .metrics import getMetricsText
 from .models import db
+from .profiling import getProfilingStats
 
 
 def addRoutes(app):
@@ -34,6 +49,63 @@ def addRoutes(app):
     Return:
         None
     '''
+    def checkYear(year):
+        '''
+        Aborts with a 404 unless a request's year is 'overall', the current
+        year or a year with episodes. Graphs built for a year are kept, so
+        any other year would fill the disk with empty graphs.
+        '''
+        if year not in ['overall', str(date.today().year), *getYears()]:
+            abort(404)
+
+    def checkGraphParameters(graphType, graphYear, graphTheme, themes=None):
+        '''
+        Aborts with a 404 unless a request's graph parameters are known
+        values. Graphs are built from these parameters.
+        '''
+        if graphType not in GRAPH_TYPES:
+            abort(404)
+        checkYear(graphYear)
+        if graphTheme:
+            if themes is None:
+                themes = getThemes()
+            if graphTheme not in themes:
+                abort(404)
+
+    def conditionalResponse(render, modified=(), etagParts=()):
+        '''
+        Renders a page only if the browser's cached copy is out of date,
+        otherwise responds 304 Not Modified without rendering it. The
+        page's ETag and Last-Modified come from the data version and
+        anything else the page is built from.
+
+        Args:
+            render (function): Renders the page.
+            modified (list[float]) - optional: Timestamps of anything other
+                than the data that the page changes with.
+            etagParts (list) - optional: Anything else the page changes
+                with, e.g. its parameters.
+        Returns:
+            (Response): The rendered page or an empty 304 response.
+        '''
+        lastModified = max([getDataVersion(), *modified])
+        # Admins.is_authenticated is a method rather than a property
+        etag = sha256(dumps([lastModified,
+                             bool(current_user.is_authenticated),
+                             *etagParts]).encode()).hexdigest()
+        lastModified = datetime.utcfromtimestamp(int(lastModified))
+        if request.if_none_match:
+            current = request.if_none_match.contains(etag)
+        else:
+            current = (request.if_modified_since is not None and
+                       request.if_modified_since >= lastModified)
+        response = make_response(('', 304) if current else render())
+        response.set_etag(etag)
+        response.last_modified = lastModified
+        # browsers must check back before reusing their copy
+        response.cache_control.no_cache = True
+        return response
+
     @app.route('/', methods=['GET', 'POST'])
     def index():
         '''
@@ -48,28 +120,77 @@ def addRoutes(app):
             # Bokeh graph
             graphType = request.form['graphType']
             year = request.form['year']
+            theme = request.form.get('theme', '')
             return redirect(url_for('index',
                                     graphType=graphType,
-                                    graphYear=year))
+                                    graphYear=year,
+                                    graphTheme=theme))
 
         # GET
         # render template with default parameters where:
         #   year == current year | graph type == overall accuracy
         graphType = request.args.get('graphType', 'overallAccuracy')
         graphYear = request.args.get('graphYear', str(date.today().year))
-        if graphYear == 'overall':
-            graph = graphType
-        else:
-            graph = graphType + graphYear
-
-        return render_template('index.html',
-                               title='Science or Fiction',
-                               form=form,
-                               graph=graph,
-                               graphType=graphType,
-                               graphYear=graphYear,
-                               years=getYears(desc=True),
-                               themes=getThemes())
+        graphTheme = request.args.get('graphTheme', '')
+        # themes are only needed up front to check a themed graph exists
+        themes = getThemes() if graphTheme else None
+        checkGraphParameters(graphType, graphYear, graphTheme, themes)
+        graph = getGraphName(graphType, graphYear, graphTheme)
+
+        def render():
+            return render_template('index.html',
+                                   title='Science or Fiction',
+                                   form=form,
+                                   graph=graph,
+                                   # graphs may still be building in the
+                                   # background after startup
+                                   graphReady=ensureGraph(graphType,
+                                                          graphYear,
+                                                          graphTheme),
+                                   graphType=graphType,
+                                   graphYear=graphYear,
+                                   graphTheme=graphTheme,
+                                   years=getYears(desc=True),
+                                   themes=themes or getThemes(),
+                                   bokehVersion=bokehVersion)
+
+        # the page embeds a CSRF token tied to the session which expires, so
+        # it is sent again before the token is more than half its time limit
+        # old and whenever the session changes
+        generate_csrf()
+        timeLimit = app.config.get('WTF_CSRF_TIME_LIMIT', 3600)
+        csrfRefreshed = 0
+        if timeLimit:
+            csrfRefreshed = time() // (timeLimit / 2) * (timeLimit / 2)
+        return conditionalResponse(
+            render,
+            modified=[getGraphModified(graph), csrfRefreshed],
+            etagParts=[graph, session.get('csrf_token')])
+
+    @app.route('/api/<graphType>')
+    def graphData(graphType):
+        '''
+        Serves the data for a graph as JSON. Graphs on the index page fetch
+        their data from here. Takes the same graphYear and graphTheme
+        parameters as the index page.
+        '''
+        graphYear = request.args.get('graphYear', 'overall')
+        graphTheme = request.args.get('graphTheme', '')
+        checkGraphParameters(graphType, graphYear, graphTheme)
+        return conditionalResponse(
+            lambda: jsonify(getGraphData(graphType, graphYear, graphTheme)))
+
+    @app.route('/bokeh/<version>/<path:filename>')
+    def bokehjs(version, filename):
+        '''
+        Serves BokehJS from the installed bokeh package so graphs don't have
+        to load it from a CDN. The version is part of the url so it can be
+        cached for a year and still change whenever bokeh is upgraded.
+        '''
+        if version != bokehVersion:
+            abort(404)
+        return send_from_directory(path.join(bokehjsdir(), 'js'), filename,
+                                   cache_timeout=60*60*24*365)
 
     @app.route('/overallAccuracy')
     def overallAccuracy():
@@ -100,12 +221,37 @@ def addRoutes(app):
         '''
         Page that displays appropriate tables to the user.
         '''
-        return render_template('data.html',
-                               title='Science or Fiction',
-                               userFriendlyRogues=getUserFriendlyRogues(db),
-                               userFriendlyGuests=getUserFriendlyGuests(db),
-                               ep_data=getUserFriendlyEpisodeData(db),
-                               sum_data=getUserFriendlyEpisodeSums(db))
+        return conditionalResponse(
+            lambda: render_template('data.html',
+                                    title='Science or Fiction',
+                                    **getDataSummaries(db)))
+
+    @app.route('/export/<dataset>.<fmt>')
+    def export(dataset, fmt):
+        '''
+        Streams episodes, results or participant summaries as CSV or NDJSON
+        for offline analysis, e.g. /export/results.csv. Takes optional year,
+        theme and participant parameters to filter the export to.
+        '''
+        if dataset not in EXPORT_DATASETS or fmt not in EXPORT_FORMATS:
+            abort(404)
+        year = request.args.get('year', 'overall')
+        checkYear(year)
+        participant_id = False
+        if request.args.get('participant'):
+            participant = getParticipant(request.args['participant'])
+            if not participant:
+                abort(404)
+            participant_id = participant.id
+        query, keys = queryExport(dataset, daterange=getDaterange(year),
+                                  theme=request.args.get('theme', False),
+                                  participant_id=participant_id)
+        # the db session has to outlive the view while rows are streamed
+        return Response(
+            stream_with_context(streamExport(query, keys, fmt)),
+            mimetype=EXPORT_FORMATS[fmt],
+            headers={'Content-Disposition':
+                     f'attachment; filename={dataset}.{fmt}'})
 
     @app.route('/about')
     def about():
@@ -199,15 +345,9 @@ def addRoutes(app):
                                guests=getGuests(),
                                themes=getThemes(),
                                participants=getAllParticipants(),
-                               episodes=getAllEpisodes(),
-                               results=getAllResults(),
-                               userFriendlyRogues=getUserFriendlyRogues(db),
-                               userFriendlyGuests=getUserFriendlyGuests(db),
-                               ep_data=getUserFriendlyEpisodeData(db),
-                               sum_data=getUserFriendlyEpisodeSums(db),
+                               nextEpNum=getNextEpNum(),
                                admins=getAdmin(all=True),
-                               today_date=date.today()
-                               )
+                               today_date=date.today())
 
     @app.route('/admin/login', methods=['GET', 'POST'])
     def admin_login():
@@ -333,14 +473,79 @@ def addRoutes(app):
         logout_user()
         return redirect(url_for('admin'))
 
+    @app.route('/admin/tables/<table>')
+    @login_required
+    def adminTable(table):
+        '''
+        Serves a page of one of the admin page's tables as JSON, see
+        getTablePage. Takes sort, order, search and limit parameters, and
+        an after or before cursor from the previous page served.
+        - can only be access if logged in (redirects to /admin/login if not) -
+        '''
+        if table not in ADMIN_TABLES:
+            abort(404)
+        sort = request.args.get('sort', 'id')
+        if sort not in ADMIN_TABLES[table]['sort']:
+            abort(404)
+        cursors = {}
+        for key in ['after', 'before']:
+            if key in request.args:
+                cursor = request.args.get(key, type=loads)
+                if not isinstance(cursor, list) or len(cursor) != 2:
+                    abort(400)
+                cursors[key] = cursor
+        limit = min(max(request.args.get('limit', 50, type=int), 1), 500)
+        try:
+            page = getTablePage(table, sort=sort,
+                                desc=request.args.get('order') == 'desc',
+                                search=request.args.get('search', ''),
+                                limit=limit, **cursors)
+        except (TypeError, ValueError):
+            # a cursor that doesn't match the sort column
+            abort(400)
+        return jsonify(page)
+
     @app.route('/refreshGraphs')
     @login_required
     def refreshGraphs():
         '''
         Exists in order to have all graphs in the bokeh folder updated with any
-        new information that may exist.
+        new information that may exist. Only stale graphs are rebuilt unless
+        the force parameter is given. Graphs are built in the background and
+        a refresh is ignored if one is already running.
         - can only be access if logged in (redirects to /admin/login if not) -
         '''
-        from .extensions import init_graphs
-        init_graphs(app)
+        force = request.args.get('force', '').lower() in ['1', 'true', 'yes']
+        startGraphBuild(app, force=force)
         return redirect(url_for('admin'))
+
+    @app.route('/refreshGraphs/status')
+    @login_required
+    def refreshGraphsStatus():
+        '''
+        Reports the progress of the most recent graph refresh as JSON.
+        - can only be access if logged in (redirects to /admin/login if not) -
+        '''
+        return jsonify(getGraphBuildStatus())
+
+    @app.route('/admin/sqlStats')
+    @login_required
+    def sqlStats():
+        '''
+        Reports the number of queries and database time of each endpoint
+        as JSON, if SQL_PROFILING is turned on.
+        - can only be access if logged in (redirects to /admin/login if not) -
+        '''
+        return jsonify(getProfilingStats())
+
+    @app.route('/metrics')
+    def metricsScrape():
+        '''
+        Serves request and graph build latencies in the Prometheus text
+        format, if METRICS_ENABLED is turned on.
+        '''
+        text = getMetricsText()
+        if text is None:
+            abort(404)
+        return (text, 200,
+                {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
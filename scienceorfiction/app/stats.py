@@ -5,7 +5,52 @@
 # Used to collect useful stats to be
 # displayed by Bokeh graphs
 
-from .extensions import getAllEpisodes, getEpisode, getParticipant, getResults
+import numpy as np
+
+from .extensions import (getAllEpisodes, getParticipant, getResultTotals,
+                         queryResults)
+from .models import Episodes, Participants, Results, db
+
+
+def getResultColumns(participant_id=False, daterange=False, theme=False):
+    '''
+    Loads the results table (joined to episodes for dates and participants
+    for names) into NumPy column arrays with a single query so stats can be
+    computed without building an ORM object per row.
+
+    Args:
+        participant_id (int) - optional: Only load results for a single
+            participant.
+        daterange (list or tuple) - optional: Only load results within a
+            date window.
+        theme (str) - optional: Only load results for a given theme.
+    Returns:
+        (dict): Column arrays ordered by episode date. Keys are episode_id,
+            participant_id, name, date, is_correct, is_scored, is_absent and
+            is_presenter.
+    '''
+    query = queryResults(
+        Results.episode_id, Results.participant_id, Participants.name,
+        Episodes.date, Results.is_correct, Results.is_absent,
+        Results.is_presenter, participant_id=participant_id,
+        daterange=daterange, theme=theme)
+    rows = query.order_by(Episodes.date, Results.id).all()
+
+    (episode_ids, participant_ids, names, dates,
+     correct, absent, presenter) = list(zip(*rows)) or [()] * 7
+    # is_correct is nullable, converting to float maps NULL to NaN so
+    # absent/presenter rows can be told apart from incorrect ones
+    correct = np.array(correct, dtype=float)
+    return {
+        'episode_id': np.array(episode_ids, dtype=np.int64),
+        'participant_id': np.array(participant_ids, dtype=np.int64),
+        'name': np.array(names, dtype=object),
+        'date': np.array(dates, dtype='datetime64[D]'),
+        'is_correct': correct == 1,
+        'is_scored': ~np.isnan(correct),
+        'is_absent': np.array(absent, dtype=bool),
+        'is_presenter': np.array(presenter, dtype=bool),
+    }
 
 
 def getRogueOverallAccuracy(roguename, daterange=False, theme=False):
@@ -22,18 +67,26 @@ def getRogueOverallAccuracy(roguename, daterange=False, theme=False):
         (tuple): (Accuracy, Total Correct, Total Incorrect)
     '''
     rogue = getParticipant(roguename)
-    # get all results
-    results = getResults(participant_id=rogue.id, daterange=daterange,
-                         theme=theme)
-    # get only results where rogue was present
-    presentResults = [result for result in results
-                      if not result.is_absent and not result.is_presenter]
-    # get only results where rogue was correct
-    correctResults = [result for result in presentResults
-                      if result.is_correct]
-    totalCorrect = len(correctResults)
-    totalIncorrect = len(presentResults) - len(correctResults)
-    total = len(presentResults)
+    totals = getResultTotals(participant_id=rogue.id, daterange=daterange,
+                             theme=theme)
+    return getAccuracy(*totals)
+
+
+def getAccuracy(totalCorrect, totalIncorrect, totalAbsent=0,
+                totalPresenter=0):
+    '''
+    Used to turn result totals from getResultTotals into an accuracy. Only
+    results where a rogue was present and not presenting are counted.
+
+    Args:
+        totalCorrect (int): Number of correct results.
+        totalIncorrect (int): Number of incorrect results.
+        totalAbsent (int) - optional: Number of absent results.
+        totalPresenter (int) - optional: Number of presenter results.
+    Returns:
+        (tuple): (Accuracy, Total Correct, Total Incorrect)
+    '''
+    total = totalCorrect + totalIncorrect
     try:
         accuracy = totalCorrect/total
     except ZeroDivisionError:
@@ -56,22 +109,54 @@ def getRogueAccuracy(roguename, daterange=False, theme=False):
 
     '''
     rogue = getParticipant(roguename)
-    # get all results
-    results = getResults(participant_id=rogue.id, daterange=daterange,
-                         theme=theme)
-    accuracies = []
-    total = 0
-    totalCorrect = 0
-    for result in results:
-        episode = getEpisode(ep_id=result.episode_id)
-        total += 1
-        if result.is_correct and not result.is_absent:
-            totalCorrect += 1
-        try:
-            accuracy = totalCorrect/total
-        except ZeroDivisionError:
-            accuracy = 0
-        accuracies.append((episode, accuracy))
+    results = getResultColumns(participant_id=rogue.id, daterange=daterange,
+                               theme=theme)
+    # every result counts towards the total, only correct answers given
+    # while present count towards the number correct
+    totalCorrect = np.cumsum(results['is_correct'] & ~results['is_absent'])
+    total = np.arange(1, len(totalCorrect) + 1)
+    accuracies = totalCorrect / total
+
+    # load all needed episodes at once rather than one query per result
+    episodeIds = results['episode_id'].tolist()
+    episodes = {}
+    if episodeIds:
+        episodes = {episode.id: episode for episode in
+                    Episodes.query.filter(Episodes.id.in_(set(episodeIds)))}
+    return [(episodes[episodeId], float(accuracy))
+            for episodeId, accuracy in zip(episodeIds, accuracies)]
+
+
+def getAccuraciesOverTime(daterange=False, theme=False):
+    '''
+    Used to get accumulated accuracy over time for every participant at once
+    using a single joined, date-ordered query.
+
+    Args:
+        daterange (list or tuple) - optional: Start and end dates for more
+            specific accuracy information
+        theme (str) - optional: Theme for more specific accuracy information.
+    Returns:
+        (dict): Participant name mapped to a tuple of (episode dates,
+            accumulated accuracies) in date order.
+    '''
+    results = getResultColumns(daterange=daterange, theme=theme)
+    # group results by participant while keeping each group in date order
+    order = np.argsort(results['participant_id'], kind='stable')
+    participantIds = results['participant_id'][order]
+    groups = np.flatnonzero(np.diff(participantIds)) + 1
+    correct = results['is_correct'][order] & ~results['is_absent'][order]
+
+    accuracies = {}
+    for indices in np.split(np.arange(len(order)), groups):
+        if not len(indices):
+            continue
+        # same as getRogueAccuracy, every result counts towards the total
+        totalCorrect = np.cumsum(correct[indices])
+        total = np.arange(1, len(indices) + 1)
+        name = results['name'][order[indices[0]]]
+        dates = results['date'][order[indices]].tolist()
+        accuracies[name] = (dates, (totalCorrect / total).tolist())
     return accuracies
 
 
@@ -87,10 +172,9 @@ def getRogueAttendance(roguename, daterange=False):
         (float): Overall attendence percentage.
     '''
     rogue = getParticipant(roguename)
-    results = getResults(participant_id=rogue.id, daterange=daterange)
-    present = [result for result in results if not result.is_absent]
-    totalPresent = len(present)
-    total = len(results)
+    results = getResultColumns(participant_id=rogue.id, daterange=daterange)
+    totalPresent = int(np.count_nonzero(~results['is_absent']))
+    total = len(results['is_absent'])
     attendance = totalPresent/total
     return attendance
 
@@ -117,23 +201,49 @@ def getSweeps(allSweeps=False, presenter=False,
     if allSweeps:
         presenter = True
         participant = True
-    episodes = getAllEpisodes(daterange=daterange)
-    sweeps = []
-    for episode in episodes:
-        results = getResults(episode_id=episode.id)
-        for result in results:
-            # remove results where participant is absent
-            # or presenter
-            if result.is_correct is None:
-                results.remove(result)
-        totalCorrect = 0
-        for result in results:
-            if result.is_correct:
-                totalCorrect += 1
-        if presenter:
-            if totalCorrect == 0:
-                sweeps.append(episode)
-        if participant:
-            if totalCorrect == len(results):
-                sweeps.append(episode)
-    return sweeps
+
+    episodes = []
+    for episode in getAllEpisodes(daterange=daterange):
+        if presenter and episode.presenter_sweep:
+            episodes.append(episode)
+        if participant and episode.participant_sweep:
+            episodes.append(episode)
+    return episodes
+
+
+def getSweepFlags(daterange=False, cumulative=False):
+    '''
+    Used to find presenter and participant sweeps for every episode from the
+    sweep flags kept on the episodes table.
+
+    Args:
+        daterange (list or tuple) - optional: Start and end dates for more
+            specific sweep information
+        cumulative (bool) - optional: If True, the presenter and participant
+            columns hold the running number of sweeps up to each episode
+            instead of a flag per episode. An episode is only counted once,
+            as a presenter sweep, if it could be both.
+    Returns:
+        (dict): Arrays ordered by episode date. Keys are episode_id, date,
+            presenter and participant.
+    '''
+    query = db.session.query(Episodes.id, Episodes.date,
+                             Episodes.presenter_sweep,
+                             Episodes.participant_sweep)
+    if daterange:
+        query = query.filter(Episodes.date.between(daterange[0],
+                                                   daterange[1]))
+    rows = query.order_by(Episodes.date, Episodes.id).all()
+
+    episode_ids, dates, presenter, participant = list(zip(*rows)) or [()] * 4
+    presenter = np.array(presenter, dtype=bool)
+    participant = np.array(participant, dtype=bool)
+    if cumulative:
+        participant = np.cumsum(participant & ~presenter)
+        presenter = np.cumsum(presenter)
+    return {
+        'episode_id': np.array(episode_ids, dtype=np.int64),
+        'date': np.array(dates, dtype='datetime64[D]'),
+        'presenter': presenter,
+        'participant': participant,
+    }
@@ -0,0 +1,541 @@
+# benchmarks.py
+# Created by: Michael Cole
+# Updated by: [Michael Cole]
+# --------------------------
+# Benchmarks for the app's hot paths.
+# Run from the scienceorfiction folder with
+# `python -m app.testing.benchmarks --output results.json`
+# and compare against an earlier run with `--compare earlier.json`.
+# Regression tests live in test_regressions.py.
+
+import tracemalloc
+from argparse import ArgumentParser
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from json import dump, load
+from os import environ, makedirs, path
+from tempfile import mkdtemp
+from time import perf_counter
+
+from flask import Flask
+from jinja2 import ChoiceLoader, FileSystemLoader
+from sqlalchemy import event
+
+from . import synthetic, testdata
+
+
+def createBenchmarkApp(database_uri='sqlite://', routes=False):
+    '''
+    Creates a bare Flask app bound to its own database and its own bokeh
+    folder so benchmarks never touch the real database or the real graphs.
+
+    Args:
+        database_uri (str) - optional: SQLAlchemy database uri to benchmark
+            against. Defaults to an in-memory SQLite database.
+        routes (bool) - optional: Set to True to add the app's routes so
+            pages can be benchmarked with a test client.
+    Returns:
+        Flask App
+    '''
+    from ..models import db
+    app = Flask('app')
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_uri
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    if routes:
+        from ..extensions import login_manager
+        from ..routes import addRoutes
+        app.config['SECRET_KEY'] = 'benchmark'
+        login_manager.init_app(app)
+        addRoutes(app)
+    # graphs are written to a throwaway bokeh folder, searched before the
+    # app's templates so pages include them instead of the real graphs
+    templates = mkdtemp()
+    environ['OUTPUT_FILEPATH'] = path.join(templates, 'bokeh', '')
+    makedirs(environ['OUTPUT_FILEPATH'])
+    app.jinja_loader = ChoiceLoader([FileSystemLoader(templates),
+                                     app.jinja_loader])
+    # settings scienceorfiction.env would provide, so the benchmarks and
+    # tests run without it
+    for name, value in [('GRAPH_BUILD_PROCESSES', '0'),
+                        ('GRAPH_BUILD_BACKGROUND', '0'),
+                        ('GRAPH_CACHE_MAX_GRAPHS', '100'),
+                        ('GRAPH_CACHE_MAX_BYTES', '52428800'),
+                        ('DATA_CACHE_DIR', ''),
+                        ('SQL_PROFILING', '0'),
+                        ('SQL_PROFILING_SLOW_REQUEST_MS', '500'),
+                        ('METRICS_ENABLED', '0')]:
+        environ.setdefault(name, value)
+    return app
+
+
+@contextmanager
+def countQueries(db):
+    '''
+    Context manager that records every SQL statement executed on the db
+    engine while it is active.
+
+    Args:
+        db (SQLAlchemy): db object from .models
+    Returns:
+        (list): Statements executed, filled in as the block runs.
+    '''
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+
+
+def seedDatabase(db, numEpisodes=None, years=None, numRogues=None,
+                 numGuests=None, bulk=True):
+    '''
+    Recreates all tables and fills them with the first numEpisodes episodes
+    of the test data.
+
+    Args:
+        db (SQLAlchemy): db object from .models
+        numEpisodes (int) - optional: Number of episodes to add. Defaults
+            to every test data episode.
+        years (int) - optional: Number of years of weekly episodes to
+            generate. Defaults to episodes since 2018.
+        numRogues (int) - optional: Number of rogues to generate.
+        numGuests (int) - optional: Number of guests to generate.
+        bulk (bool) - optional: Set to False to add episodes one at a time
+            with addEpisode instead of with bulkAddEpisodes.
+    Returns:
+        None
+    '''
+    from ..extensions import (addEpisode, addParticipant, bulkAddEpisodes,
+                              markDataChanged)
+    db.session.remove()
+    db.drop_all()
+    db.create_all()
+    rogues = testdata.getRoguesRandomized(numRogues)
+    for roguename, accuracy, start, end in rogues:
+        addParticipant(db, roguename, is_rogue=True,
+                       rogue_start_date=start,
+                       rogue_end_date=end)
+    episodes = testdata.getEpisodes(rogues, years=years,
+                                    numGuests=numGuests)[:numEpisodes]
+    if bulk:
+        bulkAddEpisodes(db, episodes)
+    else:
+        for episode in episodes:
+            addEpisode(db, episode['ep_num'], episode['ep_date'],
+                       episode['num_items'], episode['theme'],
+                       episode['guests'], episode['rogues'])
+    db.session.commit()
+    markDataChanged()
+
+
+def benchmarkSeeding(years=(2, 10, 50), numRogues=10, numGuests=200):
+    '''
+    Benchmarks seeding the database with addEpisode one episode at a time
+    and with bulkAddEpisodes. One at a time is only timed for the smallest
+    number of years.
+
+    Args:
+        years (list[int]) - optional: Years of weekly episodes to seed.
+        numRogues (int) - optional: Number of rogues to generate.
+        numGuests (int) - optional: Number of guests to generate.
+    Returns:
+        (dict): (years, bulk) mapped to seconds taken.
+    '''
+    from ..models import db
+    database = path.join(mkdtemp(), 'benchmark.db')
+    app = createBenchmarkApp('sqlite:///' + database)
+    timings = {}
+    with app.app_context():
+        for numYears in years:
+            for bulk in [False, True]:
+                if not bulk and numYears != min(years):
+                    continue
+                start = perf_counter()
+                seedDatabase(db, years=numYears, numRogues=numRogues,
+                             numGuests=numGuests, bulk=bulk)
+                timings[(numYears, bulk)] = perf_counter() - start
+                print(f'seedDatabase | {numYears:>3} years | '
+                      f'{"bulk" if bulk else "one at a time":<13} | '
+                      f'{timings[(numYears, bulk)]:.3f}s')
+    return timings
+
+
+def seedSyntheticDatabase(db, numEpisodes=20000, numRogues=5,
+                          numGuests=1000, numThemes=200, seed=0):
+    '''
+    Recreates all tables and fills them with synthetic episodes streamed
+    through bulkAddEpisodes, so large datasets can be created quickly
+    without being held in memory.
+
+    Args:
+        db (SQLAlchemy): db object from .models
+        numEpisodes (int) - optional: Number of episodes to add.
+        numRogues (int) - optional: Number of rogues.
+        numGuests (int) - optional: Number of guests to draw from.
+        numThemes (int) - optional: Number of themes to draw from.
+        seed (int) - optional: Seed for the random data.
+    Returns:
+        None
+    '''
+    from ..extensions import addParticipant, bulkAddEpisodes, markDataChanged
+    db.session.remove()
+    db.drop_all()
+    db.create_all()
+    rogues = synthetic.generateRogues(numRogues, seed=seed)
+    for roguename, accuracy, start, end in rogues:
+        addParticipant(db, roguename, is_rogue=True,
+                       rogue_start_date=start,
+                       rogue_end_date=end)
+    bulkAddEpisodes(db, synthetic.generateEpisodes(
+        rogues, numEpisodes, numGuests=numGuests, numThemes=numThemes,
+        seed=seed))
+    db.session.commit()
+    markDataChanged()
+
+
+def benchmarkSyntheticSeeding(sizes=(10000, 50000), numGuests=1000,
+                              numThemes=200):
+    '''
+    Benchmarks the time and peak Python memory taken to generate and load
+    synthetic datasets of different sizes.
+
+    Args:
+        sizes (list[int]) - optional: Numbers of episodes to seed.
+        numGuests (int) - optional: Number of guests to draw from.
+        numThemes (int) - optional: Number of themes to draw from.
+    Returns:
+        (dict): Number of episodes mapped to a tuple of (seconds taken, peak
+            bytes allocated).
+    '''
+    from ..models import db
+    database = path.join(mkdtemp(), 'benchmark.db')
+    app = createBenchmarkApp('sqlite:///' + database)
+    timings = {}
+    with app.app_context():
+        for size in sizes:
+            tracemalloc.start()
+            start = perf_counter()
+            seedSyntheticDatabase(db, size, numGuests=numGuests,
+                                  numThemes=numThemes)
+            elapsed = perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            timings[size] = (elapsed, peak)
+            print(f'seedSyntheticDatabase | {size:>6} episodes | '
+                  f'{elapsed:.3f}s | {peak / 2**20:.1f}MiB peak')
+    return timings
+
+
+def explainQuery(db, query):
+    '''
+    Gets the database's query plan for a query.
+
+    Args:
+        db (SQLAlchemy): db object from .models
+        query (Query): SQLAlchemy query to explain.
+    Returns:
+        (list[str]): Rows of the query plan.
+    '''
+    compiled = query.statement.compile(db.engine)
+    params = compiled.construct_params()
+    if compiled.positional:
+        params = tuple(params[name] for name in compiled.positiontup)
+    if db.engine.name == 'sqlite':
+        explain = 'EXPLAIN QUERY PLAN '
+    else:
+        explain = 'EXPLAIN '
+    rows = db.engine.execute(explain + str(compiled), params).fetchall()
+    return [' '.join(str(column) for column in row) for row in rows]
+
+
+def getIndexedQueries():
+    '''
+    Gets the queries getResults and getAllEpisodes run for each of their
+    filters, for benchmarking the indexes on the models.
+
+    Args:
+        None
+    Returns:
+        (dict): Name of each access path mapped to its query.
+    '''
+    from ..models import Episodes, Results
+    participant_id = 1
+    episode_id = Episodes.query.count() // 2
+    startdate = Episodes.query.get(episode_id).date
+    daterange = (startdate, startdate + timedelta(days=365))
+    theme = synthetic.generateThemes(1)[0]
+    return {
+        'results by episode': Results.query.filter_by(
+            episode_id=episode_id),
+        'results by participant': Results.query.filter_by(
+            participant_id=participant_id),
+        'results by participant and episode': Results.query.filter_by(
+            episode_id=episode_id, participant_id=participant_id),
+        'results by daterange': Results.query.join(Episodes).filter(
+            Episodes.date.between(*daterange)),
+        'results by theme': Results.query.join(Episodes).filter(
+            Episodes.theme == theme),
+        'results by participant and daterange': Results.query.join(
+            Episodes).filter(
+                Episodes.date.between(*daterange),
+                Results.participant_id == participant_id),
+        'episodes by daterange': Episodes.query.filter(
+            Episodes.date.between(*daterange)),
+    }
+
+
+def benchmarkIndexes(numEpisodes=20000, repeat=5):
+    '''
+    Benchmarks the query plans and timings of getResults and getAllEpisodes
+    access paths with the models' indexes dropped and then created.
+
+    Args:
+        numEpisodes (int) - optional: Number of synthetic episodes to seed.
+        repeat (int) - optional: Number of times each query is timed, the
+            fastest time is kept.
+    Returns:
+        (dict): 'before' and 'after' each mapping query names to a tuple of
+            (query plan, seconds taken).
+    '''
+    from ..extensions import createIndexes
+    from ..models import db
+    app = createBenchmarkApp()
+    timings = {}
+    with app.app_context():
+        seedSyntheticDatabase(db, numEpisodes)
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                index.drop(bind=db.engine)
+
+        for stage in ['before', 'after']:
+            if stage == 'after':
+                createIndexes(db)
+            timings[stage] = {}
+            for name, query in getIndexedQueries().items():
+                elapsed = []
+                for i in range(repeat):
+                    start = perf_counter()
+                    db.session.execute(query.statement).fetchall()
+                    elapsed.append(perf_counter() - start)
+                plan = explainQuery(db, query)
+                timings[stage][name] = (plan, min(elapsed))
+                print(f'{stage:>6} | {name:<36} | {min(elapsed):.4f}s | '
+                      + '; '.join(plan))
+    return timings
+
+
+def benchmarkParallelGraphBuilds(processes=(1, 2, 4), numEpisodes=None):
+    '''
+    Benchmarks the wall-clock time of a full graph rebuild when built serially
+    and when fanned out over process pools of different sizes.
+
+    Args:
+        processes (list[int]) - optional: Pool sizes to benchmark, 1 builds
+            serially.
+        numEpisodes (int) - optional: Number of episodes to seed. Defaults to
+            every test data episode.
+    Returns:
+        (dict): Pool size mapped to seconds taken.
+    '''
+    from ..extensions import GRAPH_TYPES, getYears
+    from ..graphs import buildAllGraphs
+    from ..models import db
+    # worker processes need a database they can connect to on their own
+    database = path.join(mkdtemp(), 'benchmark.db')
+    app = createBenchmarkApp('sqlite:///' + database)
+    timings = {}
+    with app.app_context():
+        seedDatabase(db, numEpisodes)
+        graphYears = getYears()
+        graphYears.append('overall')
+        for numProcesses in processes:
+            start = perf_counter()
+            built = buildAllGraphs(GRAPH_TYPES, graphYears, force=True,
+                                   processes=numProcesses)
+            timings[numProcesses] = perf_counter() - start
+            print(f'buildAllGraphs | {numProcesses:>2} processes | '
+                  f'{len(built):>4} graphs | {timings[numProcesses]:.3f}s')
+    return timings
+
+
+def measure(db, call, repeat=3):
+    '''
+    Measures a call. It is timed over repeat runs and then run once more
+    while counting queries and tracing memory, which would skew the timing.
+
+    Args:
+        db (SQLAlchemy): db object from .models
+        call (function): Function to measure, called with no arguments.
+        repeat (int) - optional: Number of timed runs, the fastest is kept.
+    Returns:
+        (dict): seconds, queries and peak_bytes of Python memory allocated.
+    '''
+    elapsed = []
+    for i in range(repeat):
+        start = perf_counter()
+        call()
+        elapsed.append(perf_counter() - start)
+    tracemalloc.start()
+    with countQueries(db) as statements:
+        call()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'seconds': min(elapsed), 'queries': len(statements),
+            'peak_bytes': peak}
+
+
+def getPage(client, url):
+    '''
+    Requests a page with a test client, failing on anything but a 200.
+
+    Args:
+        client (FlaskClient): Test client to request the page with.
+        url (str): Url of the page.
+    Returns:
+        (int): Size of the page in bytes.
+    '''
+    response = client.get(url)
+    assert response.status_code == 200, f'{url} {response.status}'
+    size = len(response.data)
+    response.close()
+    return size
+
+
+def getSuiteBenchmarks(client):
+    '''
+    Gets every benchmark in the suite: each stats function, each graph
+    builder, buildAllGraphs and the main pages.
+
+    Args:
+        client (FlaskClient): Test client, logged in as an admin.
+    Returns:
+        (dict): Name of each benchmark mapped to a function to measure.
+    '''
+    from .. import stats
+    from ..extensions import GRAPH_TYPES, getRogues, getYears
+    from ..graphs import (buildAllGraphs, getGraphData, graphRogueAccuracies,
+                          graphRogueOverallAccuracies, graphSweeps)
+    rogue = getRogues(onlyNames=True)[0]
+    graphYears = getYears() + ['overall']
+    benchmarks = {
+        'stats.getResultColumns': lambda: stats.getResultColumns(),
+        'stats.getRogueOverallAccuracy': lambda:
+            stats.getRogueOverallAccuracy(rogue),
+        'stats.getRogueAccuracy': lambda: stats.getRogueAccuracy(rogue),
+        'stats.getAccuraciesOverTime': lambda:
+            stats.getAccuraciesOverTime(),
+        'stats.getRogueAttendance': lambda: stats.getRogueAttendance(rogue),
+        'stats.getSweeps': lambda: stats.getSweeps(allSweeps=True),
+        'stats.getSweepFlags': lambda: stats.getSweepFlags(cumulative=True),
+        'graphs.graphRogueOverallAccuracies': lambda:
+            graphRogueOverallAccuracies('benchmark', force=True),
+        'graphs.graphRogueAccuracies': lambda:
+            graphRogueAccuracies('benchmark', force=True),
+        'graphs.graphSweeps': lambda: graphSweeps('benchmark', force=True),
+        'graphs.buildAllGraphs': lambda:
+            buildAllGraphs(GRAPH_TYPES, graphYears, force=True),
+    }
+    for graphType in GRAPH_TYPES:
+        benchmarks[f'graphs.getGraphData {graphType}'] = (
+            lambda graphType=graphType: getGraphData(graphType))
+    for url in ['/', '/data', '/admin', '/api/overallAccuracy']:
+        benchmarks[f'GET {url}'] = lambda url=url: getPage(client, url)
+    return benchmarks
+
+
+def runBenchmarkSuite(sizes=(1000, 5000), repeat=3, output=None):
+    '''
+    Runs every benchmark from getSuiteBenchmarks against a SQLite database
+    seeded with synthetic data of each size.
+
+    Args:
+        sizes (list[int]) - optional: Numbers of episodes to seed.
+        repeat (int) - optional: Number of timed runs of each benchmark.
+        output (str) - optional: JSON file to save the results to.
+    Returns:
+        (dict): Results, with the measurements of each benchmark under
+            'sizes' and then the number of episodes.
+    '''
+    from ..extensions import addAdmin
+    from ..models import db
+    database = path.join(mkdtemp(), 'benchmark.db')
+    app = createBenchmarkApp('sqlite:///' + database, routes=True)
+    results = {'created': datetime.now().isoformat(), 'repeat': repeat,
+               'sizes': {}}
+    with app.app_context():
+        for size in sizes:
+            seedSyntheticDatabase(db, size)
+            admin = addAdmin(db, 'benchmark', 'benchmark')
+            db.session.commit()
+            client = app.test_client()
+            with client.session_transaction() as session:
+                session['_user_id'] = str(admin.id)
+                session['_fresh'] = True
+
+            results['sizes'][str(size)] = {}
+            for name, call in getSuiteBenchmarks(client).items():
+                measured = measure(db, call, repeat)
+                results['sizes'][str(size)][name] = measured
+                print(f'{name:<40} | {size:>6} episodes | '
+                      f'{measured["seconds"]:>8.3f}s | '
+                      f'{measured["queries"]:>5} queries | '
+                      f'{measured["peak_bytes"] / 2**20:>7.1f}MiB peak')
+
+    if output:
+        with open(output, 'w') as f:
+            dump(results, f, indent=2)
+    return results
+
+
+def compareBenchmarks(before, after):
+    '''
+    Prints how each benchmark changed between two runs of
+    runBenchmarkSuite.
+
+    Args:
+        before (dict): Results of the earlier run.
+        after (dict): Results of the later run.
+    Returns:
+        None
+    '''
+    for size, benchmarks in after['sizes'].items():
+        for name, measured in benchmarks.items():
+            previous = before['sizes'].get(size, {}).get(name)
+            if not previous:
+                continue
+            speedup = previous['seconds'] / max(measured['seconds'], 1e-9)
+            print(f'{name:<40} | {size:>6} episodes | '
+                  f'{previous["seconds"]:>8.3f}s -> '
+                  f'{measured["seconds"]:>8.3f}s ({speedup:.2f}x) | '
+                  f'{previous["queries"]:>5} -> '
+                  f'{measured["queries"]:>5} queries')
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Benchmarks the app\'s hot paths.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 5000],
+                        help='Numbers of episodes to benchmark with')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Number of timed runs of each benchmark')
+    parser.add_argument('--output', help='Save the results to a JSON file')
+    parser.add_argument('--compare',
+                        help='Compare the results with an earlier JSON file')
+    parser.add_argument('--all', action='store_true',
+                        help='Also run the focused benchmarks')
+    args = parser.parse_args()
+
+    if args.all:
+        benchmarkSeeding()
+        benchmarkSyntheticSeeding()
+        benchmarkParallelGraphBuilds()
+        benchmarkIndexes()
+    results = runBenchmarkSuite(args.sizes, args.repeat, args.output)
+    if args.compare:
+        with open(args.compare) as f:
+            compareBenchmarks(load(f), results)
@@ -0,0 +1,131 @@
+# synthetic.py
+# Created by: Michael Cole
+# Updated by: [Michael Cole]
+# --------------------------
+# Deterministic synthetic data at production scale and beyond, for load
+# testing and benchmarks. Episodes are streamed in the testdata format so
+# they can be fed straight into extensions.bulkAddEpisodes.
+
+from datetime import date, timedelta
+from random import Random
+
+from . import testdata
+
+
+def generateThemes(numThemes=15):
+    '''
+    Returns a list of numThemes themes, the test data themes first.
+
+    Args:
+        numThemes (int) - optional: Number of themes.
+    Returns:
+        (list[str]): Theme names.
+    '''
+    themes = ['Star Wars', 'Star Trek', 'Numbers', 'Vaccines',
+              'Computer Science', 'Biology', 'Chemistry', 'Diseases',
+              'Spacefaring', 'Pseudosciences', 'Brains', 'Aquatic Animals',
+              'Medicine', 'Steel']
+    themes = themes[:numThemes]
+    for i in range(len(themes), numThemes):
+        themes.append(f'Theme {i + 1}')
+    return themes
+
+
+def generateRogues(numRogues=5, startDate=date(2005, 5, 4),
+                   endDate=None, seed=0):
+    '''
+    Returns numRogues rogues in the testdata.getRoguesRandomized format.
+    The test data rogues start with the show and never leave, any further
+    rogues join and some leave at random points within the date window.
+
+    Args:
+        numRogues (int) - optional: Number of rogues.
+        startDate (date) - optional: Date of the first episode.
+        endDate (date) - optional: Date of the last episode. Defaults to
+            today.
+        seed (int) - optional: Seed for the random rogues.
+    Returns:
+        (list): [name, accuracy, start date, end date] for each rogue.
+    '''
+    rand = Random(seed)
+    endDate = endDate or date.today()
+    days = (endDate - startDate).days
+    rogues = []
+    for i, name in enumerate(testdata.getRogues(numRogues)[:numRogues]):
+        accuracy = rand.choice([.9, .8, .5, .2, .1])
+        start = startDate
+        end = None
+        if i >= 5:
+            start = startDate + timedelta(days=rand.randrange(days))
+            if rand.random() < .3:
+                end = start + timedelta(
+                    days=rand.randrange((endDate - start).days + 1))
+        rogues.append([name, accuracy, start, end])
+    return rogues
+
+
+def generateEpisodes(rogues, numEpisodes=50000, numGuests=1000,
+                     numThemes=200, startDate=date(2005, 5, 4),
+                     endDate=None, seed=0):
+    '''
+    Generates numEpisodes episodes spread evenly between startDate and
+    endDate, one at a time, so even very large datasets never have to be
+    held in memory. The same seed always generates the same episodes.
+
+    Args:
+        rogues (list): Rogues from generateRogues.
+        numEpisodes (int) - optional: Number of episodes.
+        numGuests (int) - optional: Number of guests to draw from.
+        numThemes (int) - optional: Number of themes to draw from.
+        startDate (date) - optional: Date of the first episode.
+        endDate (date) - optional: Date of the last episode. Defaults to
+            today.
+        seed (int) - optional: Seed for the random results.
+    Yields:
+        (dict): Episode in the testdata.getEpisodes format.
+    '''
+    rand = Random(seed)
+    endDate = endDate or date.today()
+    days = (endDate - startDate).days
+    guests = testdata.getGuests(numGuests)[:numGuests]
+    themes = [None] + generateThemes(numThemes)
+
+    for i in range(numEpisodes):
+        ep_date = startDate + timedelta(days=days * i // numEpisodes)
+        active = [rogue for rogue in rogues
+                  if rogue[2] <= ep_date and
+                  (not rogue[3] or ep_date <= rogue[3])]
+        episode = {}
+        episode['ep_num'] = i + 1
+        episode['ep_date'] = ep_date
+        episode['theme'] = rand.choice(themes)
+        episode['num_items'] = rand.choice([3, 4])
+        episode['guests'] = []
+        episode['rogues'] = []
+
+        # the first rogue presents most episodes
+        presenter = None
+        if active:
+            presenter = active[0]
+            if rand.random() > .9:
+                presenter = rand.choice(active)
+
+        for rogue in active:
+            if rogue is presenter:
+                episode['rogues'].append((rogue[0], 'presenter'))
+            elif rand.random() < .1:
+                episode['rogues'].append((rogue[0], 'absent'))
+            elif rand.random() <= rogue[1]:
+                episode['rogues'].append((rogue[0], 'correct'))
+            else:
+                episode['rogues'].append((rogue[0], 'incorrect'))
+
+        if guests and rand.random() <= .08:
+            guest = rand.choice(guests)
+            if rand.random() >= .5:
+                episode['rogues'].append((guest, 'correct'))
+            else:
+                episode['rogues'].append((guest, 'incorrect'))
+            episode['guests'].append(guest)
+
+        yield episode
@@ -0,0 +1,434 @@
+# test_regressions.py
+# Created by: Michael Cole
+# Updated by: [Michael Cole]
+# --------------------------
+# Regression tests for the app's hot paths, checking the optimised queries,
+# rollups and caches agree with working everything out from scratch.
+# Run from the scienceorfiction folder with
+# `python -m unittest app.testing.test_regressions`
+
+import unittest
+from csv import reader
+from datetime import date
+from io import StringIO
+from json import dumps
+from operator import itemgetter
+from os import environ, listdir
+from unittest.mock import patch
+
+from sqlalchemy import func
+
+from app.export import EXPORT_DATASETS, queryExport
+from app.extensions import (addAdmin, addParticipant, addResult,
+                            getDataSummaries, getDataVersion,
+                            getGraphBuildStatus, getGuests, getParticipant,
+                            getResultTotals, getRogues, getThemes, getTotals,
+                            getUserFriendlyEpisodeSums, getYears,
+                            graphBuildJob, queryResults, rebuildResultTotals,
+                            runGraphBuild, updateEpisodeSummaries)
+from app.graphs import getGraph
+from app.models import Episodes, Participants, ResultTotals, Results, db
+from app.testing.benchmarks import (countQueries, createBenchmarkApp,
+                                    seedDatabase)
+
+
+class RegressionTestCase(unittest.TestCase):
+    '''
+    Runs each test inside the app context of a fresh benchmark app bound to
+    an in-memory database.
+    '''
+    routes = False
+
+    def setUp(self):
+        self.app = createBenchmarkApp(routes=self.routes)
+        context = self.app.app_context()
+        context.push()
+        self.addCleanup(context.pop)
+        self.addCleanup(db.session.remove)
+
+
+class TestAccuracyOverTimeQueries(RegressionTestCase):
+
+    def test_query_count_constant(self):
+        '''
+        The number of queries needed to build an accuracyOverTime graph stays
+        constant as the number of episodes grows.
+        '''
+        sizes = [50, 100, 200, 400]
+        for graphYear in ['overall', '2019']:
+            counts = {}
+            for size in sizes:
+                seedDatabase(db, size)
+                with countQueries(db) as statements:
+                    getGraph('accuracyOverTime', graphYear)
+                counts[size] = len(statements)
+            with self.subTest(graphYear=graphYear):
+                self.assertEqual(len(set(counts.values())), 1, counts)
+
+
+class TestParticipantQueries(RegressionTestCase):
+
+    def test_single_query_matches_python_filter(self):
+        '''
+        getRogues and getGuests each filter with a single query and agree
+        with filtering every participant in Python.
+        '''
+        seedDatabase(db)
+        participants = Participants.query.order_by(Participants.name).all()
+        dates = dict(db.session.query(Episodes.id, Episodes.date))
+        appearances = {}
+        for result in Results.query:
+            appearances.setdefault(result.participant_id, []).append(
+                dates[result.episode_id])
+
+        for year in map(int, getYears()):
+            daterange = (date(year, 1, 1), date(year, 12, 31))
+            current_date = date(year, 6, 1)
+            expected = {
+                'getRogues daterange': [
+                    p.name for p in participants if p.is_rogue and
+                    p.rogue_start_date < daterange[1] and
+                    (p.rogue_end_date or date.today()) > daterange[0]],
+                'getRogues current_date': [
+                    p.name for p in participants if p.is_rogue and
+                    p.rogue_start_date < current_date <=
+                    (p.rogue_end_date or date.today())],
+                'getGuests daterange': [
+                    p.name for p in participants if not p.is_rogue and
+                    any(daterange[0] <= d <= daterange[1]
+                        for d in appearances.get(p.id, []))],
+            }
+            calls = {
+                'getRogues daterange': lambda: getRogues(
+                    onlyNames=True, daterange=daterange),
+                'getRogues current_date': lambda: getRogues(
+                    current_date=current_date),
+                'getGuests daterange': lambda: getGuests(
+                    daterange=daterange),
+            }
+            for name, call in calls.items():
+                with self.subTest(call=name, year=year):
+                    with countQueries(db) as statements:
+                        found = call()
+                    found = [getattr(p, 'name', p) for p in found]
+                    self.assertEqual(found, expected[name])
+                    self.assertEqual(len(statements), 1)
+
+
+class TestResultTotals(RegressionTestCase):
+
+    def getRollup(self):
+        return sorted(db.session.query(
+            ResultTotals.participant_id, ResultTotals.year,
+            ResultTotals.theme, ResultTotals.correct, ResultTotals.incorrect,
+            ResultTotals.absent, ResultTotals.presenter))
+
+    def test_maintained_matches_rebuild(self):
+        '''
+        The result_totals rollup kept up to date by addEpisode and
+        bulkAddEpisodes matches one rebuilt from scratch.
+        '''
+        for bulk in [True, False]:
+            with self.subTest(bulk=bulk):
+                seedDatabase(db, 300, bulk=bulk)
+                maintained = self.getRollup()
+                rebuildResultTotals(db)
+                self.assertEqual(maintained, self.getRollup())
+
+    def test_totals_match_results(self):
+        '''
+        Totals read from the result_totals rollup match totalling every
+        result.
+        '''
+        seedDatabase(db, 300)
+        for year in ['overall'] + getYears():
+            daterange = False
+            if year != 'overall':
+                daterange = (date(int(year), 1, 1), date(int(year), 12, 31))
+            for theme in [False] + getThemes():
+                scanned = queryResults(
+                    Results.participant_id,
+                    func.sum(Results.is_correct, type_=db.Integer),
+                    func.count(Results.is_correct),
+                    func.sum(Results.is_absent, type_=db.Integer),
+                    func.sum(Results.is_presenter, type_=db.Integer),
+                    daterange=daterange, theme=theme).group_by(
+                        Results.participant_id)
+                expected = {row[0]: getTotals(*row[1:]) for row in scanned}
+                with self.subTest(year=year, theme=theme):
+                    self.assertEqual(
+                        getResultTotals(groupBy=Results.participant_id,
+                                        daterange=daterange, theme=theme),
+                        expected)
+
+
+class TestEpisodeSummaries(RegressionTestCase):
+
+    def getSummaries(self):
+        return sorted(db.session.query(
+            Episodes.id, Episodes.num_correct, Episodes.num_incorrect,
+            Episodes.num_absent, Episodes.presenter_id,
+            Episodes.presenter_sweep, Episodes.participant_sweep))
+
+    def test_maintained_matches_backfill(self):
+        '''
+        The episode summary columns kept up to date by addEpisode and
+        bulkAddEpisodes match ones backfilled from the results.
+        '''
+        for bulk in [True, False]:
+            with self.subTest(bulk=bulk):
+                seedDatabase(db, 300, bulk=bulk)
+                maintained = self.getSummaries()
+                updateEpisodeSummaries(db)
+                self.assertEqual(maintained, self.getSummaries())
+
+    def test_added_result_updates_summary(self):
+        '''
+        A result added to an episode on its own brings the episode's summary
+        columns and the data version up to date.
+        '''
+        seedDatabase(db, 50)
+        episode = Episodes.query.first()
+        guest = addParticipant(db, 'Late Guest', commit=True)
+        version = getDataVersion()
+        addResult(db, episode.id, guest.id, 'incorrect', commit=True)
+        self.assertEqual(episode.num_incorrect,
+                         Results.query.filter_by(episode_id=episode.id,
+                                                 is_correct=False).count())
+        self.assertFalse(episode.participant_sweep)
+        maintained = self.getSummaries()
+        updateEpisodeSummaries(db)
+        self.assertEqual(maintained, self.getSummaries())
+        self.assertNotEqual(getDataVersion(), version)
+
+    def test_episode_sums_match_results(self):
+        '''
+        Episode totals read from the summary columns match totalling every
+        result.
+        '''
+        seedDatabase(db, 300)
+        scanned = db.session.query(
+            Episodes.ep_num, func.sum(Results.is_correct, type_=db.Integer),
+            func.count(Results.is_correct)).join(Results).group_by(
+                Episodes.ep_num).having(
+                    func.sum(Results.is_presenter, type_=db.Integer) > 0)
+        expected = {ep_num: (correct, scored - correct)
+                    for ep_num, correct, scored in scanned}
+        found = {row.ep_num: (row.correct, row.incorrect)
+                 for row in getUserFriendlyEpisodeSums(db)}
+        self.assertEqual(found, expected)
+
+
+class TestConditionalPages(RegressionTestCase):
+    routes = True
+
+    def test_etags_per_visitor(self):
+        '''
+        The pages answering conditional GETs render for both anonymous
+        visitors and logged in admins, each gets its own ETag, and
+        revalidating with it answers 304.
+        '''
+        seedDatabase(db, 100)
+        admin = addAdmin(db, 'benchmark', 'benchmark')
+        db.session.commit()
+        anonymous = self.app.test_client()
+        loggedIn = self.app.test_client()
+        with loggedIn.session_transaction() as session:
+            session['_user_id'] = str(admin.id)
+            session['_fresh'] = True
+
+        for url in ['/', '/data', '/api/overallAccuracy']:
+            etags = []
+            for visitor, client in [('anonymous', anonymous),
+                                    ('admin', loggedIn)]:
+                with self.subTest(url=url, visitor=visitor):
+                    # the first request builds the graph the page shows
+                    client.get(url).close()
+                    response = client.get(url)
+                    self.assertEqual(response.status_code, 200)
+                    etags.append(response.get_etag()[0])
+                    response = client.get(url, headers={
+                        'If-None-Match': f'"{etags[-1]}"'})
+                    self.assertEqual(response.status_code, 304)
+            with self.subTest(url=url):
+                self.assertEqual(len(etags), 2)
+                self.assertNotEqual(etags[0], etags[1])
+
+
+class TestAdminTables(RegressionTestCase):
+    routes = True
+
+    def getPages(self, client, table, sort, order):
+        '''
+        Pages through a table to its end and back again, returning the rows
+        seen each way.
+        '''
+        def getPage(**cursor):
+            params = {'sort': sort, 'order': order, 'limit': 7}
+            params.update({key: dumps(value)
+                           for key, value in cursor.items()})
+            return client.get(f'/admin/tables/{table}',
+                              query_string=params).get_json()
+
+        page = getPage()
+        forwards = page['rows']
+        while page['next']:
+            page = getPage(after=page['next'])
+            forwards += page['rows']
+        backwards = page['rows']
+        while page['prev']:
+            page = getPage(before=page['prev'])
+            backwards = page['rows'] + backwards
+        return forwards, backwards
+
+    def test_summaries_match_data_page(self):
+        '''
+        Paging through the summaries on the admin page, forwards and
+        backwards, gives the same rows as the summary tables on /data.
+        '''
+        seedDatabase(db, 100)
+        admin = addAdmin(db, 'benchmark', 'benchmark')
+        db.session.commit()
+        client = self.app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(admin.id)
+            session['_fresh'] = True
+
+        summaries = getDataSummaries(db)
+        guests = summaries['userFriendlyGuests']
+        tables = {
+            ('rogueSummaries', 'name', 'asc'): sorted(
+                summaries['userFriendlyRogues'], key=itemgetter('name')),
+            ('guestSummaries', 'num_appearances', 'desc'): guests,
+            ('episodeSummaries', 'ep_num', 'desc'): [
+                dict(episode, **totals) for episode, totals in
+                zip(summaries['ep_data'], summaries['sum_data'])],
+        }
+        for (table, sort, order), expected in tables.items():
+            pages = self.getPages(client, table, sort, order)
+            for direction, rows in zip(['forwards', 'backwards'], pages):
+                with self.subTest(table=table, direction=direction):
+                    columns = set(expected[0]).intersection(rows[0])
+                    found = [{column: row[column] for column in columns}
+                             for row in rows]
+                    wanted = [{column: str(row[column])
+                               if isinstance(row[column], date)
+                               else row[column] for column in columns}
+                              for row in expected]
+                    if table == 'guestSummaries':
+                        # ties in appearances are in id order when paged
+                        found.sort(key=lambda row: (-row[sort],
+                                                    row['name']))
+                        wanted.sort(key=lambda row: (-row[sort],
+                                                     row['name']))
+                    self.assertEqual(found, wanted)
+
+        # the summaries aren't rendered into the admin page itself
+        page = client.get('/admin').get_data(as_text=True)
+        self.assertNotIn(f'<th>{summaries["ep_data"][0]["ep_num"]}</th>',
+                         page)
+
+
+class TestExport(RegressionTestCase):
+    routes = True
+
+    def test_batches_match_single_query(self):
+        '''
+        Exports read a batch at a time give the same rows, in the same order,
+        as reading the whole query at once.
+        '''
+        seedDatabase(db, 100)
+        client = self.app.test_client()
+        participant_id = getParticipant('Bob Novella').id
+        # request parameters mapped to the queryExport arguments they give
+        filters = [
+            ({}, {}),
+            ({'year': '2019'},
+             {'daterange': (date(2019, 1, 1), date(2019, 12, 31))}),
+            ({'theme': 'Biology'}, {'theme': 'Biology'}),
+            ({'participant': 'Bob Novella'},
+             {'participant_id': participant_id}),
+        ]
+        with patch('app.export.EXPORT_BATCH_SIZE', 7):
+            for dataset in EXPORT_DATASETS:
+                for params, arguments in filters:
+                    with self.subTest(dataset=dataset, params=params):
+                        query, keys = queryExport(dataset, **arguments)
+                        expected = [['' if value is None else str(value)
+                                     for value in row]
+                                    for row in query.order_by(*keys)]
+                        response = client.get(f'/export/{dataset}.csv',
+                                              query_string=params)
+                        rows = list(reader(StringIO(
+                            response.get_data(as_text=True))))
+                        self.assertEqual(rows[1:], expected)
+
+
+class TestGraphParameters(RegressionTestCase):
+    routes = True
+
+    def test_unknown_years_not_found(self):
+        '''
+        Years without episodes answer 404 rather than building and keeping an
+        empty graph for them, or failing on years dates can't hold.
+        '''
+        seedDatabase(db, 50)
+        client = self.app.test_client()
+        for url in ['/?graphYear=1000', '/?graphYear=99999',
+                    '/api/overallAccuracy?graphYear=0',
+                    '/export/results.csv?year=0']:
+            with self.subTest(url=url):
+                self.assertEqual(client.get(url).status_code, 404)
+        self.assertEqual(listdir(environ['OUTPUT_FILEPATH']), [])
+
+        year = getYears()[0]
+        for url in [f'/?graphYear={year}', '/api/overallAccuracy?graphYear='
+                    f'{year}', f'/export/results.csv?year={year}']:
+            with self.subTest(url=url):
+                self.assertEqual(client.get(url).status_code, 200)
+
+
+class TestGraphBuilds(RegressionTestCase):
+    routes = True
+
+    def test_force_parsed(self):
+        '''
+        Only force values meaning yes rebuild every graph.
+        '''
+        seedDatabase(db, 20)
+        admin = addAdmin(db, 'benchmark', 'benchmark')
+        db.session.commit()
+        client = self.app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(admin.id)
+            session['_fresh'] = True
+        for value, force in [('', False), ('0', False), ('false', False),
+                             ('no', False), ('1', True), ('true', True),
+                             ('Yes', True)]:
+            with self.subTest(force=value), \
+                    patch('app.routes.startGraphBuild') as startGraphBuild:
+                client.get('/refreshGraphs', query_string={'force': value})
+                startGraphBuild.assert_called_once_with(self.app, force=force)
+
+    def test_status_shared(self):
+        '''
+        The progress of a build is reported by workers that didn't run it.
+        '''
+        seedDatabase(db, 20)
+        db.session.commit()
+        with patch.dict(graphBuildJob):
+            graphBuildJob.update(running=True, graphs={})
+            runGraphBuild(self.app)
+            built = getGraphBuildStatus()
+        # another worker's graphBuildJob has never seen a build
+        with patch.dict(graphBuildJob, {'running': False}, clear=True):
+            status = getGraphBuildStatus()
+        self.assertFalse(status['running'])
+        self.assertIsNone(status['error'])
+        self.assertGreater(status['total'], 0)
+        self.assertEqual(status['done'], status['total'])
+        self.assertEqual(status, built)
+
+
+if __name__ == '__main__':
+    unittest.main()
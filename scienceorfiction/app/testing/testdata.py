@@ -8,18 +8,22 @@ from datetime import date, timedelta
 from random import shuffle, choice, random
 
 
-def getRogues():
-    '''Returns list of Rogues'''
+def getRogues(numRogues=None):
+    '''Returns list of Rogues, padded with made up rogues up to numRogues'''
     rogueList = ['Steve Novella', 'Bob Novella', 'Jay Novella',
                  'Evan Bernstein', 'Cara Santa Maria']
+    for i in range(len(rogueList), numRogues or 0):
+        rogueList.append(f'Rogue {i + 1}')
     return rogueList
 
 
-def getGuests():
-    '''Returns a list of Guests'''
+def getGuests(numGuests=None):
+    '''Returns a list of Guests, padded with made up guests up to numGuests'''
     guestList = ['George Hrab', 'Bill Nye', 'Britt Hermes',
                  'Neil deGrasse Tyson', 'Jennifer Oulette',
                  'Richard Wiseman']
+    for i in range(len(guestList), numGuests or 0):
+        guestList.append(f'Guest {i + 1}')
     return guestList
 
 
@@ -29,12 +33,16 @@ def getAdmins():
     return adminList
 
 
-def getRoguesRandomized():
-    rogues = getRogues()
+def getRoguesRandomized(numRogues=None):
+    rogues = getRogues(numRogues)
     participant_accuracy_choices = [.9, .8, .5, .2, .1]
     start_dates = [date(2005, 5, 4), date(2005, 5, 4), date(2006, 9, 3),
                    date(2012, 7, 19), date(2005, 5, 4)]
-    end_dates = [None, None, None, None, None]
+    # made up rogues get a random accuracy and start date
+    for i in range(len(participant_accuracy_choices), len(rogues)):
+        participant_accuracy_choices.append(choice([.9, .8, .5, .2, .1]))
+        start_dates.append(choice(start_dates[:5]))
+    end_dates = [None for rogue in rogues]
     shuffle(participant_accuracy_choices)
     shuffle(start_dates)
     shuffle(end_dates)
@@ -45,9 +53,16 @@ def getRoguesRandomized():
     return roguesRandomized
 
 
-def getEpisodes(rogues):
+def getEpisodes(rogues, years=None, numGuests=None):
+    '''
+    Returns a list of weekly episodes up to today, starting in 2018 or
+    the given number of years ago, with guests drawn from numGuests guests
+    '''
     episodeList = []
     ep_date = date(2018, 5, 4)
+    if years:
+        ep_date = date.today() - timedelta(weeks=52 * years)
+    guests = getGuests(numGuests)
     ep_num = 1
     num_items_choices = [3, 4]
     themes_choices = [None, 'Star Wars', 'Star Trek', 'Numbers', 'Vaccines',
@@ -99,7 +114,7 @@ def getEpisodes(rogues):
                     episode['rogues'].append((rogue[0], 'presenter'))
 
         if random() <= .08:
-            guest = choice(getGuests())
+            guest = choice(guests)
             if random() >= .5:
                 participant = (guest, 'correct')
             else:
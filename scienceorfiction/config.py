@@ -45,3 +45,15 @@ class Config:
 
     # bokeh settings
     OUTPUT_FILEPATH = environ['OUTPUT_FILEPATH']
+    GRAPH_BUILD_PROCESSES = environ['GRAPH_BUILD_PROCESSES']
+    GRAPH_BUILD_BACKGROUND = environ['GRAPH_BUILD_BACKGROUND']
+    GRAPH_CACHE_MAX_GRAPHS = environ['GRAPH_CACHE_MAX_GRAPHS']
+    GRAPH_CACHE_MAX_BYTES = environ['GRAPH_CACHE_MAX_BYTES']
+
+    # data cache settings
+    DATA_CACHE_DIR = environ['DATA_CACHE_DIR']
+
+    # profiling settings
+    SQL_PROFILING = environ['SQL_PROFILING']
+    SQL_PROFILING_SLOW_REQUEST_MS = environ['SQL_PROFILING_SLOW_REQUEST_MS']
+    METRICS_ENABLED = environ['METRICS_ENABLED']